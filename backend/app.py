@@ -1,20 +1,25 @@
 # backend/app.py - FIXED VERSION WITH PROPER SAVINGS CALCULATION
 from flask import Flask, jsonify, request, send_file, send_from_directory, session
 from flask_cors import CORS
+from config import Config
+from database import close_all_connections, get_connection
+from migrations import run_migrations
 from tracker import StorenvyPriceTracker
 from stock_tracker import StockPriceTracker
 from scheduler_service import PersistentSchedulerService
+from indicators import INDICATOR_ALERT_TYPES, MAX_PERIOD
+from write_buffer import close_all_buffers
 import asyncio
 import json
 from pathlib import Path
 import os
 import hashlib
-import sqlite3
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import secrets
 
 app = Flask(__name__)
-app.secret_key = secrets.token_hex(32)  # Generate a secure secret key
+# Every worker process must sign sessions with the same key; wsgi.py sets one if SECRET_KEY is unset
+app.secret_key = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
 CORS(app, supports_credentials=True)  # Enable CORS with credentials
 
 # Initialize trackers
@@ -24,26 +29,15 @@ stock_tracker = StockPriceTracker()
 # Initialize scheduler service
 scheduler_service = PersistentSchedulerService()
 
+def start_scheduler_if_enabled():
+    """Start the in-process scheduler, unless it runs as its own service (see wsgi.py)"""
+    if Config.START_SCHEDULER_FROM_WEB and not scheduler_service.is_running():
+        scheduler_service.start()
+
 # Initialize auth database
 def init_auth_db():
     """Initialize authentication database"""
-    conn = sqlite3.connect('storenvy_tracker.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            first_name TEXT NOT NULL,
-            last_name TEXT,
-            smtp_password TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    run_migrations()
 
 init_auth_db()
 
@@ -51,6 +45,13 @@ init_auth_db()
 def hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
 
+# Helper function for history query parameters: stored timestamps are naive UTC
+def parse_utc_param(value):
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
 # SERVE THE FRONTEND
 @app.route('/')
 def index():
@@ -133,7 +134,7 @@ def signup():
         if len(password) < 6:
             return jsonify({'error': 'Password must be at least 6 characters long'}), 400
         
-        conn = sqlite3.connect('storenvy_tracker.db')
+        conn = get_connection()
         cursor = conn.cursor()
         
         try:
@@ -158,8 +159,7 @@ def signup():
             session['user_name'] = first_name
             
             # Auto-start scheduler for new user
-            if not scheduler_service.is_running():
-                scheduler_service.start()
+            start_scheduler_if_enabled()
             
             return jsonify({
                 'message': 'Account created successfully',
@@ -196,7 +196,7 @@ def login():
         if not email or not password:
             return jsonify({'error': 'Email and password are required'}), 400
         
-        conn = sqlite3.connect('storenvy_tracker.db')
+        conn = get_connection()
         cursor = conn.cursor()
         
         try:
@@ -218,8 +218,7 @@ def login():
             session['user_name'] = user[2]
             
             # Auto-start scheduler on login
-            if not scheduler_service.is_running():
-                scheduler_service.start()
+            start_scheduler_if_enabled()
             
             return jsonify({
                 'message': 'Login successful',
@@ -278,7 +277,7 @@ def update_smtp():
         if not smtp_password:
             return jsonify({'error': 'SMTP password is required'}), 400
         
-        conn = sqlite3.connect('storenvy_tracker.db')
+        conn = get_connection()
         cursor = conn.cursor()
         
         try:
@@ -306,7 +305,7 @@ def get_user_email_config():
     if 'user_id' not in session:
         return None
     
-    conn = sqlite3.connect('storenvy_tracker.db')
+    conn = get_connection()
     cursor = conn.cursor()
     
     try:
@@ -371,8 +370,7 @@ def add_product():
         tracker.add_product(url, target_price, session['user_id'])
         
         # Auto-start scheduler when first product is added
-        if not scheduler_service.is_running():
-            scheduler_service.start()
+        start_scheduler_if_enabled()
         
         return jsonify({'message': f'Product from {platform.title()} added successfully'}), 201
         
@@ -393,6 +391,31 @@ def delete_product(product_id):
         print(f"Delete product error: {e}")
         return jsonify({'error': 'Failed to delete product'}), 500
 
+@app.route('/api/products/<int:product_id>/history', methods=['GET'])
+def get_product_history(product_id):
+    """Get a product's price history, downsampled on the server to at most max_points points"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    try:
+        end = parse_utc_param(request.args['end']) if 'end' in request.args else datetime.utcnow()
+        start = parse_utc_param(request.args['start']) if 'start' in request.args else end - timedelta(days=90)
+        max_points = min(int(request.args.get('max_points', 500)), 2000)
+    except ValueError:
+        return jsonify({'error': 'start/end must be ISO timestamps and max_points an integer'}), 400
+    
+    if start >= end or max_points <= 0:
+        return jsonify({'error': 'Invalid time range or max_points'}), 400
+    
+    try:
+        history = tracker.get_price_history(product_id, session['user_id'], start, end, max_points)
+        if history is None:
+            return jsonify({'error': 'Product not found'}), 404
+        return jsonify(history)
+    except Exception as e:
+        print(f"Product history error: {e}")
+        return jsonify({'error': 'Failed to load product history'}), 500
+
 # STOCK API ROUTES
 @app.route('/api/stocks', methods=['GET'])
 def get_stock_alerts():
@@ -422,7 +445,7 @@ def add_stock_alert():
             return jsonify({'error': 'Symbol, alert type, and threshold are required'}), 400
         
         # Validate alert type
-        valid_alert_types = ['price_above', 'price_below', 'percent_up', 'percent_down']
+        valid_alert_types = ['price_above', 'price_below', 'percent_up', 'percent_down'] + list(INDICATOR_ALERT_TYPES)
         if alert_type not in valid_alert_types:
             return jsonify({'error': f'Invalid alert type. Must be one of: {valid_alert_types}'}), 400
         
@@ -433,11 +456,15 @@ def add_stock_alert():
         except (ValueError, TypeError):
             return jsonify({'error': 'Invalid threshold format'}), 400
         
+        # Indicator alerts use the threshold as a period in days
+        if alert_type in INDICATOR_ALERT_TYPES:
+            if threshold != int(threshold) or not 2 <= threshold <= MAX_PERIOD:
+                return jsonify({'error': f'Period must be a whole number of days between 2 and {MAX_PERIOD}'}), 400
+        
         stock_tracker.add_stock_alert(symbol, alert_type, threshold, session['user_id'])
         
         # Auto-start scheduler when first alert is added
-        if not scheduler_service.is_running():
-            scheduler_service.start()
+        start_scheduler_if_enabled()
         
         return jsonify({'message': f'Stock alert added for {symbol}'}), 201
         
@@ -458,6 +485,28 @@ def delete_stock_alert(alert_id):
         print(f"Delete stock alert error: {e}")
         return jsonify({'error': 'Failed to delete stock alert'}), 500
 
+@app.route('/api/stocks/<symbol>/history', methods=['GET'])
+def get_stock_history(symbol):
+    """Get OHLCV price bars for a symbol, at a resolution picked for the time span"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+    
+    try:
+        end = parse_utc_param(request.args['end']) if 'end' in request.args else datetime.utcnow()
+        start = parse_utc_param(request.args['start']) if 'start' in request.args else end - timedelta(days=7)
+        max_points = min(int(request.args.get('max_points', 500)), 2000)
+    except ValueError:
+        return jsonify({'error': 'start/end must be ISO timestamps and max_points an integer'}), 400
+    
+    if start >= end or max_points <= 0:
+        return jsonify({'error': 'Invalid time range or max_points'}), 400
+    
+    try:
+        return jsonify(stock_tracker.get_price_history(symbol, start, end, max_points))
+    except Exception as e:
+        print(f"Stock history error: {e}")
+        return jsonify({'error': 'Failed to load stock history'}), 500
+
 # STATISTICS ROUTES - FIXED SAVINGS CALCULATION
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
@@ -471,44 +520,10 @@ def get_stats():
             'triggered_stock_alerts': 0,
             'monitoring_stock_alerts': 0
         })
-
     
     try:
-        # Product stats
-        products = tracker.get_tracked_products(session['user_id'])
-        
-        total_products = len(products)
-        products_below_target = 0
-        total_savings = 0.0
-        
-        # FIXED: Only calculate savings for products that actually have current prices AND are below target
-        for product in products:
-            current_price = product.get('last_price')
-            target_price = product.get('target_price', 0)
-            
-            # Only count if we have a current price AND it's below target
-            if current_price is not None and current_price <= target_price:
-                products_below_target += 1
-                savings = target_price - current_price
-                total_savings += savings
-                print(f"💰 Savings calculated: {product.get('title', 'Unknown')[:30]}... - ${savings:.2f}")
-        
-        print(f"📊 FIXED Stats Summary:")
-        print(f"   - Total products: {total_products}")
-        print(f"   - Products below target: {products_below_target}")
-        print(f"   - Total savings: ${total_savings:.2f}")
-        
-        # Stock stats
-        stock_stats = stock_tracker.get_stock_stats(session['user_id'])
-        
-        return jsonify({
-            'total_products': total_products,
-            'products_below_target': products_below_target,
-            'total_savings': round(total_savings, 2),  # FIXED: Now only real savings
-            'total_stock_alerts': stock_stats['total_alerts'],
-            'triggered_stock_alerts': stock_stats['triggered_alerts'],
-            'monitoring_stock_alerts': stock_stats['monitoring_alerts']
-        })
+        # Single-row read: user_stats is maintained by triggers on every product/alert write
+        return jsonify(tracker.get_user_stats(session['user_id']))
         
     except Exception as e:
         print(f"Stats error: {e}")
@@ -521,6 +536,44 @@ def get_stats():
             'monitoring_stock_alerts': 0
         })
 
+@app.route('/api/scheduler/runs', methods=['GET'])
+def get_scheduler_runs():
+    """Get recent scheduled job runs with their timings, plus per-job totals over them"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    try:
+        limit = min(int(request.args.get('limit', 50)), 500)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+
+    try:
+        # Read from scheduler_runs, so any worker can answer whichever process runs the jobs
+        runs = scheduler_service.run_log.recent(request.args.get('job'), limit)
+        return jsonify({
+            'runs': runs,
+            'summary': scheduler_service.run_log.summary(runs)
+        })
+    except Exception as e:
+        print(f"Scheduler runs error: {e}")
+        return jsonify({'error': 'Failed to load scheduler runs'}), 500
+
+@app.route('/api/scheduler/latency', methods=['GET'])
+def get_scheduler_latency():
+    """Get each user's wait from a check run coming due to their items being checked, in the latest runs"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    try:
+        users = scheduler_service.run_log.user_latency(request.args.get('kind'))
+        return jsonify({
+            'users': users,
+            'mine': [user for user in users if user['user_id'] == session['user_id']]
+        })
+    except Exception as e:
+        print(f"Scheduler latency error: {e}")
+        return jsonify({'error': 'Failed to load scheduler latency'}), 500
+
 if __name__ == '__main__':
     print("\n" + "="*60)
     print("🛍️  TAGTRACKER - SMART PRICE MONITORING")
@@ -536,8 +589,11 @@ if __name__ == '__main__':
     print("\n⏹️  Press Ctrl+C to stop the web server")
     print("="*60 + "\n")
     
+    scheduler_service.install_signal_handlers()
     try:
         app.run(debug=True, port=5000, host='0.0.0.0')
     finally:
         # Stop scheduler when app shuts down
-        scheduler_service.stop()
\ No newline at end of file
+        scheduler_service.stop()
+        close_all_buffers()
+        close_all_connections()
\ No newline at end of file
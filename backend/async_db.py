@@ -0,0 +1,45 @@
+# backend/async_db.py - Run blocking database calls off the event loop
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class AsyncDatabase:
+    """Async front end for the sync data-access methods.
+
+    Every call runs on one dedicated thread, which keeps its own persistent
+    connection (database.get_connection is per-thread) and serializes writes the
+    way SQLite wants them, while the event loop keeps driving the scrapes. The
+    Flask routes keep calling the sync methods directly.
+    """
+
+    def __init__(self, name: str = 'sqlite'):
+        self.name = name
+        self._reset()
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Await func(*args, **kwargs) executed on the database thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def close(self) -> None:
+        """Let queued calls finish, then stop the thread."""
+        self._executor.shutdown(wait=True)
+
+    def _reset(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+
+
+# Shared by the product and stock trackers so all their writes go through one thread
+database_thread = AsyncDatabase()
+
+
+def _reset_executors_after_fork() -> None:
+    """A forked worker inherits the executor but none of its threads; start over."""
+    database_thread._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_executors_after_fork)
@@ -0,0 +1,271 @@
+# backend/async_scheduler.py - Timer-based job scheduler running as tasks on one asyncio loop
+import asyncio
+import logging
+import math
+import random
+import time
+from datetime import datetime, time as dt_time, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from async_db import database_thread
+
+logger = logging.getLogger(__name__)
+
+# What to do when a job comes due while its previous run is still going
+OVERLAP_POLICIES = ('skip', 'queue', 'cancel_previous')
+# What to do on startup about due times missed while no scheduler was running
+CATCH_UP_POLICIES = ('run_once', 'skip')
+
+
+class ScheduledJob:
+    """A coroutine function run every `interval` seconds, or daily at a local wall-clock time.
+
+    The function may return a dict with 'items' and 'failures' counts for the run log,
+    and 'interrupted': True if it stopped early and left work to resume. If
+    `interrupted` is given it is called (on the database thread) when the scheduler
+    starts, and a True result makes the job due at once to finish that work.
+    """
+
+    def __init__(self, name: str, func: Callable[[], Awaitable], interval: Optional[float] = None,
+                 daily_at: Optional[str] = None, run_at_start: bool = True, overlap: str = 'skip',
+                 interrupted: Optional[Callable[[], bool]] = None):
+        if (interval is None) == (daily_at is None):
+            raise ValueError("Give a job either an interval or a daily_at time")
+        if overlap not in OVERLAP_POLICIES:
+            raise ValueError(f"Unknown overlap policy {overlap!r} for job {name!r}, expected one of {OVERLAP_POLICIES}")
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.daily_at = dt_time.fromisoformat(daily_at) if daily_at else None
+        self.run_at_start = run_at_start
+        self.overlap = overlap
+        self.interrupted = interrupted
+        self.next_run: Optional[datetime] = None
+        self.last_run: Optional[datetime] = None
+        self.last_duration: Optional[float] = None
+        self.current: Optional[asyncio.Task] = None  # The run in progress, if any
+        self.skipped = 0
+
+    @property
+    def running(self) -> bool:
+        return self.current is not None and not self.current.done()
+
+    def overran(self, duration: float) -> bool:
+        """True if a run took longer than the gap to the job's next due time."""
+        limit = self.interval if self.interval is not None else 24 * 60 * 60
+        return duration > limit
+
+    def first_run(self, now: datetime) -> datetime:
+        if self.interval is not None and self.run_at_start:
+            return now
+        return self.next_after(now)
+
+    def next_after(self, start: datetime) -> datetime:
+        """When the job is next due after a run that started at `start` (local time)."""
+        if self.interval is not None:
+            return start + timedelta(seconds=self.interval)
+        candidate = datetime.combine(start.date(), self.daily_at)
+        return candidate if candidate > start else candidate + timedelta(days=1)
+
+    def next_on_cadence(self, due: datetime, now: datetime) -> datetime:
+        """The first due time after `now` on the same cadence as an earlier due time."""
+        if self.interval is not None and due <= now:
+            missed = math.floor((now - due).total_seconds() / self.interval) + 1
+            return due + timedelta(seconds=missed * self.interval)
+        return self.next_after(now) if due <= now else due
+
+
+class AsyncScheduler:
+    """Runs each job as its own task on the current event loop, sleeping on loop timers until due.
+
+    A job's next run is computed from the time it came due. Each run is a task of its
+    own, so a run still going when the job comes due again is handled by the job's
+    overlap policy: 'skip' drops the new run, 'queue' starts it as soon as the old one
+    ends (due times missed meanwhile collapse into that one run) and 'cancel_previous'
+    cancels the old run and starts afresh. With a run_log every run, skip included,
+    is recorded in scheduler_runs through the database thread.
+
+    The run log also keeps each job's last run and next due time, and run() resumes
+    from them: a job not yet due waits for its saved time, and one that came due while
+    no scheduler was running follows the catch-up policy ('run_once' runs it once now,
+    'skip' waits for its next slot on the old cadence). Jobs due on startup are spread
+    over a random delay of up to startup_jitter seconds (capped at their interval) so
+    a restart doesn't set every job off at once.
+
+    stop() cancels every job task, including runs in progress, and run() returns once
+    they have unwound.
+    """
+
+    def __init__(self, run_log=None, holder: Callable[[], Optional[str]] = lambda: None,
+                 guard: Callable[[str], bool] = lambda job: True,
+                 catch_up: str = 'run_once', startup_jitter: float = 0.0):
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"Unknown catch-up policy {catch_up!r}, expected one of {CATCH_UP_POLICIES}")
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.run_log = run_log  # scheduler_runs.SchedulerRunLog, or None to keep no history
+        self.holder = holder    # Id recorded with each run (the lease holder)
+        self.guard = guard      # Checked when a job comes due; False skips it without a record
+        self.catch_up = catch_up
+        self.startup_jitter = startup_jitter
+
+    def every(self, name: str, seconds: float, func: Callable[[], Awaitable], run_at_start: bool = True,
+              overlap: str = 'skip', interrupted: Optional[Callable[[], bool]] = None) -> ScheduledJob:
+        job = ScheduledJob(name, func, interval=seconds, run_at_start=run_at_start, overlap=overlap,
+                           interrupted=interrupted)
+        self.jobs[name] = job
+        return job
+
+    def daily(self, name: str, at: str, func: Callable[[], Awaitable], overlap: str = 'skip') -> ScheduledJob:
+        job = ScheduledJob(name, func, daily_at=at, overlap=overlap)
+        self.jobs[name] = job
+        return job
+
+    async def _record(self, method: str, *args):
+        if not self.run_log:
+            return None
+        try:
+            return await database_thread.run(getattr(self.run_log, method), *args)
+        except Exception as e:
+            logger.error(f"❌ Scheduler run log {method} failed: {e}")
+            return None
+
+    def resume(self, job: ScheduledJob, saved: Optional[tuple], now: datetime, interrupted: bool = False) -> datetime:
+        """Pick a job's first due time from its saved (last_run, next_due), if it has one."""
+        last_run, next_due = saved or (None, None)
+        if last_run is not None:
+            job.last_run = datetime.fromtimestamp(last_run)
+
+        if interrupted:
+            due = now
+            logger.info(f"↩️ Job {job.name} was interrupted - resuming it")
+        elif next_due is None:
+            due = job.first_run(now)
+        else:
+            due = datetime.fromtimestamp(next_due)
+            if due <= now:
+                if self.catch_up == 'skip':
+                    due = job.next_on_cadence(due, now)
+                    logger.info(f"⏭️ Job {job.name} missed its run while stopped - resuming at {due:%Y-%m-%d %H:%M:%S}")
+                else:
+                    due = now
+                    logger.info(f"↩️ Job {job.name} missed its run while stopped - catching up once")
+
+        if due <= now and self.startup_jitter > 0:
+            jitter = min(self.startup_jitter, job.interval or self.startup_jitter)
+            due = now + timedelta(seconds=random.uniform(0, jitter))
+        return due
+
+    async def _run_once(self, job: ScheduledJob) -> None:
+        job.last_run = datetime.now()
+        started = time.monotonic()
+        run_id = await self._record('start', job.name, self.holder())
+        status, items, failures = 'ok', 0, 0
+
+        try:
+            result = await job.func()
+            if isinstance(result, dict):
+                items = result.get('items', 0)
+                failures = result.get('failures', 0)
+                if result.get('interrupted'):
+                    status = 'interrupted'
+        except asyncio.CancelledError:
+            status = 'cancelled'
+            raise
+        except Exception as e:
+            status = 'failed'
+            logger.error(f"❌ Job {job.name} failed: {e}")
+        finally:
+            job.last_duration = time.monotonic() - started
+            overrun = job.overran(job.last_duration)
+            if overrun:
+                logger.warning(f"🐢 Job {job.name} overran: took {job.last_duration:.1f}s")
+            if run_id is not None:
+                await self._record('finish', run_id, status, items, failures, overrun)
+
+    async def _job_loop(self, job: ScheduledJob) -> None:
+        if job.next_run is None:
+            job.next_run = job.first_run(datetime.now())
+        try:
+            while True:
+                delay = (job.next_run - datetime.now()).total_seconds()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                job.next_run = job.next_on_cadence(job.next_run, datetime.now())
+
+                if not self.guard(job.name):
+                    continue
+
+                # Persist the cadence before running, so a restart mid-run doesn't repeat this run
+                skip = job.running and job.overlap == 'skip'
+                await self._record('save_job_state', job.name, None if skip else time.time(),
+                                   job.next_run.timestamp())
+
+                if job.running:
+                    if skip:
+                        job.skipped += 1
+                        logger.warning(f"⏭️ Job {job.name} still running - skipping this run")
+                        await self._record('skipped', job.name, self.holder())
+                        continue
+                    if job.overlap == 'cancel_previous':
+                        logger.warning(f"✂️ Job {job.name} still running - cancelling it for a fresh run")
+                        job.current.cancel()
+                    else:
+                        logger.warning(f"⏳ Job {job.name} still running - queueing the next run behind it")
+                    await asyncio.gather(job.current, return_exceptions=True)
+
+                job.current = asyncio.create_task(self._run_once(job), name=f"run:{job.name}")
+        finally:
+            if job.running:
+                job.current.cancel()
+                await asyncio.gather(job.current, return_exceptions=True)
+
+    async def run(self) -> None:
+        """Run every registered job until stop() is called."""
+        saved = {}
+        if self.run_log:
+            abandoned = await database_thread.run(self.run_log.abandon_unfinished)
+            if abandoned:
+                logger.info(f"🧹 Closed {abandoned} run(s) left unfinished by a previous scheduler")
+            saved = await self._record('load_job_state') or {}
+
+        now = datetime.now()
+        for job in self.jobs.values():
+            interrupted = bool(job.interrupted and await database_thread.run(job.interrupted))
+            job.next_run = self.resume(job, saved.get(job.name), now, interrupted)
+
+        self._tasks = [asyncio.create_task(self._job_loop(job), name=f"job:{job.name}") for job in self.jobs.values()]
+        try:
+            await asyncio.gather(*self._tasks)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.stop()
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for the runs in progress to finish. True if they all did."""
+        runs = [job.current for job in self.jobs.values() if job.running]
+        if not runs:
+            return True
+        done, still_running = await asyncio.wait(runs, timeout=timeout)
+        return not still_running
+
+    async def stop(self) -> None:
+        """Cancel every job task and wait for them (and their runs) to finish unwinding."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def status(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                'running': job.running,
+                'overlap': job.overlap,
+                'last_run': job.last_run.isoformat() if job.last_run else None,
+                'last_duration_seconds': round(job.last_duration, 3) if job.last_duration is not None else None,
+                'next_run': job.next_run.isoformat() if job.next_run else None,
+                'skipped': job.skipped,
+            }
+            for name, job in self.jobs.items()
+        }
@@ -21,4 +21,35 @@ class Config:
     # Scraping settings
     HEADLESS_BROWSER = os.environ.get('HEADLESS_BROWSER', 'True').lower() == 'true'
     REQUEST_DELAY_SECONDS = int(os.environ.get('REQUEST_DELAY_SECONDS', 3))
-
+    
+    # Streaming quote settings (leave both empty to poll stocks every 5 minutes)
+    STOCK_STREAM_URL = os.environ.get('STOCK_STREAM_URL', '')
+    STOCK_REPLAY_FILE = os.environ.get('STOCK_REPLAY_FILE', '')
+    STOCK_HISTORY_INTERVAL_SECONDS = int(os.environ.get('STOCK_HISTORY_INTERVAL_SECONDS', 60))
+    
+    # Production web server (wsgi.py)
+    WEB_HOST = os.environ.get('WEB_HOST', '0.0.0.0')
+    WEB_PORT = int(os.environ.get('WEB_PORT', 5000))
+    WEB_WORKERS = int(os.environ.get('WEB_WORKERS', 0))  # 0 = 2 x CPU cores + 1
+    WEB_THREADS = int(os.environ.get('WEB_THREADS', 8))
+    # Start the scheduler from the web app on login (off by default under wsgi.py, on under service_app.py).
+    # Either way only the process holding the scheduler lease runs jobs.
+    START_SCHEDULER_FROM_WEB = os.environ.get('START_SCHEDULER_FROM_WEB', 'True').lower() == 'true'
+    SCHEDULER_LEASE_SECONDS = int(os.environ.get('SCHEDULER_LEASE_SECONDS', 60))
+    # What a job does when it comes due while its last run is still going: skip, queue or cancel_previous
+    PRODUCT_OVERLAP_POLICY = os.environ.get('PRODUCT_OVERLAP_POLICY', 'skip')
+    STOCK_OVERLAP_POLICY = os.environ.get('STOCK_OVERLAP_POLICY', 'skip')
+    # On restart, jobs keep their saved cadence. One missed while stopped either runs once (run_once)
+    # or waits for its next slot (skip); jobs due at startup are spread over up to this many seconds.
+    SCHEDULER_CATCH_UP = os.environ.get('SCHEDULER_CATCH_UP', 'run_once')
+    SCHEDULER_STARTUP_JITTER_SECONDS = float(os.environ.get('SCHEDULER_STARTUP_JITTER_SECONDS', 60))
+    # On shutdown, scrapes in flight get this long to finish; the rest of the product run resumes on restart
+    SHUTDOWN_GRACE_SECONDS = float(os.environ.get('SHUTDOWN_GRACE_SECONDS', 60))
+    # Fair share between users in each product / stock check run. Weights are 'user_id:weight,...'
+    # (default 1 each); quotas cap the products / symbols a user's turns may pick per run (0 = none).
+    FAIR_SHARE_WEIGHTS = os.environ.get('FAIR_SHARE_WEIGHTS', '')
+    USER_PRODUCT_QUOTA = int(os.environ.get('USER_PRODUCT_QUOTA', 0))
+    USER_STOCK_QUOTA = int(os.environ.get('USER_STOCK_QUOTA', 0))
+    PRODUCT_CHECK_CONCURRENCY = int(os.environ.get('PRODUCT_CHECK_CONCURRENCY', 1))
+    STOCK_CHECK_CONCURRENCY = int(os.environ.get('STOCK_CHECK_CONCURRENCY', 1))
+    PER_USER_CONCURRENCY = int(os.environ.get('PER_USER_CONCURRENCY', 1))
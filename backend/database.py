@@ -0,0 +1,194 @@
+# backend/database.py - Shared SQLite access: per-thread persistent connections with WAL
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from typing import Dict
+
+from config import Config
+
+DEFAULT_DB_PATH = Config.DATABASE_PATH
+
+# Applied once per connection. journal_mode=WAL is stored in the database file,
+# the rest are per-connection settings.
+PRAGMAS = [
+    "PRAGMA journal_mode=WAL",        # Readers don't block the writer and vice versa
+    "PRAGMA synchronous=NORMAL",      # fsync at checkpoints only; safe with WAL
+    "PRAGMA busy_timeout=5000",       # Wait up to 5s for a lock instead of failing at once
+    "PRAGMA cache_size=-20000",       # ~20 MB page cache
+    "PRAGMA mmap_size=268435456",     # Memory-map up to 256 MB of the file
+    "PRAGMA temp_store=MEMORY",
+]
+
+
+class PersistentConnection(sqlite3.Connection):
+    """sqlite3 connection that stays open when callers close() it.
+
+    Callers keep the usual connect / commit / close pattern; close() just rolls back
+    anything left uncommitted (as a real close would) and hands the connection back
+    for the next caller on this thread. Use release() to really close it.
+    """
+
+    def close(self) -> None:
+        if self.in_transaction:
+            self.rollback()
+
+    def release(self) -> None:
+        super().close()
+
+
+_local = threading.local()
+_all_connections = weakref.WeakSet()
+_all_connections_lock = threading.Lock()
+
+
+def configure_connection(conn: sqlite3.Connection) -> None:
+    cursor = conn.cursor()
+    for pragma in PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+def get_connection(db_path: str = DEFAULT_DB_PATH) -> PersistentConnection:
+    """Get this thread's persistent connection to db_path, opening and tuning it on first use.
+
+    Connections are not meant to be nested: finish (commit or close) one unit of work
+    before starting another on the same thread.
+    """
+    connections: Dict[str, PersistentConnection] = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(db_path, factory=PersistentConnection)
+        configure_connection(conn)
+        connections[db_path] = conn
+        with _all_connections_lock:
+            _all_connections.add(conn)
+    elif conn.in_transaction:
+        # A previous caller raised before commit/close; don't inherit its writes or locks
+        conn.rollback()
+
+    return conn
+
+
+def close_all_connections() -> None:
+    """Really close every pooled connection (call at shutdown)."""
+    with _all_connections_lock:
+        connections = list(_all_connections)
+        _all_connections.clear()
+    for conn in connections:
+        try:
+            conn.release()
+        except sqlite3.ProgrammingError:
+            pass  # Owned by another thread; it is closed when that thread exits
+    _local.connections = {}
+
+
+def _forget_connections_after_fork() -> None:
+    """In a forked worker, drop the parent's connections without closing them (SQLite
+    handles must not cross fork); each thread opens its own on next use."""
+    global _all_connections_lock
+    _local.__dict__.clear()
+    _all_connections.clear()
+    _all_connections_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_connections_after_fork)
+
+
+def benchmark_database(operations: int = 2000, seconds: float = 3.0, readers: int = 4) -> None:
+    """Compare connect-per-call against persistent connections, and rollback journal against WAL."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # 1. Connect overhead: one SELECT per call
+        path = os.path.join(tmp, 'connect.db')
+        setup = sqlite3.connect(path)
+        setup.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, v REAL)')
+        setup.executemany('INSERT INTO t (v) VALUES (?)', [(i,) for i in range(1000)])
+        setup.commit()
+        setup.close()
+
+        start = time.perf_counter()
+        for i in range(operations):
+            conn = sqlite3.connect(path)
+            conn.execute('SELECT v FROM t WHERE id = ?', (i % 1000 + 1,)).fetchone()
+            conn.close()
+        per_call = (time.perf_counter() - start) / operations
+
+        start = time.perf_counter()
+        for i in range(operations):
+            conn = get_connection(path)
+            conn.execute('SELECT v FROM t WHERE id = ?', (i % 1000 + 1,)).fetchone()
+            conn.close()
+        persistent = (time.perf_counter() - start) / operations
+
+        print(f"Connect overhead ({operations} point reads):")
+        print(f"  sqlite3.connect per call: {per_call * 1e6:8.1f} µs/op")
+        print(f"  persistent connection:    {persistent * 1e6:8.1f} µs/op ({per_call / persistent:.1f}x faster)")
+
+        # 2. Contention: one writer committing small transactions while readers poll
+        for mode in ('DELETE', 'WAL'):
+            path = os.path.join(tmp, f'contention_{mode}.db')
+            setup = sqlite3.connect(path)
+            setup.execute(f'PRAGMA journal_mode={mode}')
+            setup.execute('CREATE TABLE t (id INTEGER PRIMARY KEY, v REAL)')
+            setup.commit()
+            setup.close()
+
+            stop = threading.Event()
+            counts = {'writes': 0, 'reads': 0, 'locked': 0}
+            counts_lock = threading.Lock()
+
+            def connect():
+                conn = sqlite3.connect(path, timeout=0.05)  # journal_mode was set on the file above
+                if mode == 'WAL':
+                    conn.execute('PRAGMA synchronous=NORMAL')
+                return conn
+
+            def writer():
+                conn = connect()
+                while not stop.is_set():
+                    try:
+                        conn.execute('INSERT INTO t (v) VALUES (?)', (time.time(),))
+                        conn.commit()
+                        with counts_lock:
+                            counts['writes'] += 1
+                    except sqlite3.OperationalError:
+                        conn.rollback()
+                        with counts_lock:
+                            counts['locked'] += 1
+                conn.close()
+
+            def reader():
+                conn = connect()
+                while not stop.is_set():
+                    try:
+                        conn.execute('SELECT COUNT(*), MAX(v) FROM t').fetchone()
+                        with counts_lock:
+                            counts['reads'] += 1
+                    except sqlite3.OperationalError:
+                        with counts_lock:
+                            counts['locked'] += 1
+                conn.close()
+
+            threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+            for t in threads:
+                t.start()
+            time.sleep(seconds)
+            stop.set()
+            for t in threads:
+                t.join()
+
+            print(f"Contention, journal_mode={mode} (1 writer, {readers} readers, {seconds:.0f}s):")
+            print(f"  writes/s: {counts['writes'] / seconds:8.0f}   reads/s: {counts['reads'] / seconds:8.0f}"
+                  f"   'database is locked' errors: {counts['locked']}")
+
+        close_all_connections()
+
+
+if __name__ == "__main__":
+    benchmark_database()
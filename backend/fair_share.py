@@ -0,0 +1,177 @@
+# backend/fair_share.py - Fair ordering and per-user limits for the scheduled product and stock checks
+import asyncio
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+def parse_weights(spec: str) -> Dict[int, float]:
+    """Parse a 'user_id:weight,user_id:weight' setting; users not listed get weight 1."""
+    weights = {}
+    for part in filter(None, (p.strip() for p in spec.split(','))):
+        user_id, weight = part.split(':')
+        weights[int(user_id)] = float(weight)
+    return weights
+
+
+class UserLatency:
+    """Per-user time from when work came due to when it was checked, for one run."""
+
+    def __init__(self, due_at: float):
+        self.due_at = due_at
+        self.latencies: Dict[int, List[float]] = {}
+        self.failed: Counter = Counter()
+        self.deferred: Counter = Counter()
+
+    def checked(self, user_ids: Iterable[int], ok: bool, at: Optional[float] = None) -> None:
+        latency = (at if at is not None else time.time()) - self.due_at
+        for user_id in user_ids:
+            self.latencies.setdefault(user_id, []).append(latency)
+            if not ok:
+                self.failed[user_id] += 1
+
+    def report(self) -> Dict[int, Dict]:
+        """user_id -> counts and average / p95 / max latency in seconds."""
+        report = {}
+        for user_id in set(self.latencies) | set(self.deferred):
+            values = sorted(self.latencies.get(user_id, []))
+            report[user_id] = {
+                'checked': len(values),
+                'failed': self.failed[user_id],
+                'deferred': self.deferred[user_id],
+                'avg_latency': round(sum(values) / len(values), 3) if values else None,
+                'p95_latency': round(values[min(len(values) - 1, int(len(values) * 0.95))], 3) if values else None,
+                'max_latency': round(values[-1], 3) if values else None,
+            }
+        return report
+
+
+class FairShareScheduler:
+    """Interleaves due work across users instead of running it in one global order.
+
+    plan() deals items out by smooth weighted round robin over user_id (plain round
+    robin when every weight is 1), so a user with a thousand products gets one turn
+    per round like everyone else. An item can belong to several users (a stock
+    symbol several users have alerts on): it is checked once, on the turn of the
+    first user to reach it, and counts as checked for all of them. quota caps the
+    items a user's turns may pick per run; the rest are deferred to the next run.
+
+    run() works through the plan with up to `concurrency` items in flight, at most
+    `per_user_concurrency` of them charged to any one user, and records each owner's
+    latency from due_at to the item being checked. drain() makes a run stop taking
+    new items and return once those in flight are done.
+    """
+
+    def __init__(self, weights: Optional[Dict[int, float]] = None, quota: int = 0,
+                 concurrency: int = 1, per_user_concurrency: int = 1):
+        self.weights = weights or {}
+        self.quota = quota
+        self.concurrency = max(1, concurrency)
+        self.per_user_concurrency = max(1, per_user_concurrency)
+        self.draining = False
+        self._drained: Optional[asyncio.Event] = None
+
+    def drain(self) -> None:
+        """Let the current run finish its in-flight items but start no more (call on the run's loop)."""
+        self.draining = True
+        if self._drained:
+            self._drained.set()
+
+    def plan(self, items: List[Any], key: Callable[[Any], Hashable],
+             owners: Callable[[Any], Iterable[int]]) -> Tuple[List[Tuple[int, Any]], List[Any]]:
+        """Order items fairly. Returns ([(charged user_id, item)], deferred items).
+
+        Each user's items keep their order in `items`.
+        """
+        queues: Dict[int, deque] = {}
+        for item in items:
+            for user_id in owners(item):
+                queues.setdefault(user_id, deque()).append(item)
+
+        current = {user_id: 0.0 for user_id in queues}
+        taken: Counter = Counter()
+        planned: set = set()
+        plan: List[Tuple[int, Any]] = []
+
+        while queues:
+            # Smooth weighted round robin: everyone gains their weight, the leader pays the total
+            total = 0.0
+            for user_id in queues:
+                weight = self.weights.get(user_id, 1.0)
+                current[user_id] += weight
+                total += weight
+            user_id = max(queues, key=lambda u: (current[u], -u))
+            current[user_id] -= total
+
+            queue = queues[user_id]
+            while queue and key(queue[0]) in planned:
+                queue.popleft()  # Already picked on another owner's turn
+            if not queue or (self.quota and taken[user_id] >= self.quota):
+                del queues[user_id]
+                continue
+
+            item = queue.popleft()
+            planned.add(key(item))
+            taken[user_id] += 1
+            plan.append((user_id, item))
+
+        deferred = []
+        for item in items:
+            if key(item) not in planned:
+                planned.add(key(item))
+                deferred.append(item)
+        return plan, deferred
+
+    async def run(self, plan: List[Tuple[int, Any]], work: Callable[[Any], Awaitable[bool]],
+                  owners: Callable[[Any], Iterable[int]], latency: UserLatency,
+                  pause: Optional[Callable[[], Awaitable]] = None) -> bool:
+        """Await work(item) for every planned item, in plan order subject to the concurrency limits.
+
+        work returns whether the check succeeded. pause, if given, is awaited by a
+        worker between its items (the scrapers' rate limiting). Returns False if the
+        run was drained before every item was taken.
+        """
+        self.draining = False
+        self._drained = asyncio.Event()
+        slot_freed = asyncio.Event()
+        pending = list(plan)
+        in_flight: Counter = Counter()
+
+        async def next_item() -> Optional[Tuple[int, Any]]:
+            while pending and not self.draining:
+                for i, (user_id, _) in enumerate(pending):
+                    if in_flight[user_id] < self.per_user_concurrency:
+                        in_flight[user_id] += 1
+                        return pending.pop(i)
+                # Every remaining item belongs to a user at their limit; wait for a slot (or a drain)
+                slot_freed.clear()
+                await wait_first(slot_freed.wait())
+            return None
+
+        async def wait_first(*aws: Awaitable) -> None:
+            """Await whichever finishes first of aws and a drain."""
+            tasks = [asyncio.ensure_future(aw) for aw in aws] + [asyncio.ensure_future(self._drained.wait())]
+            try:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        async def worker() -> None:
+            while True:
+                entry = await next_item()
+                if entry is None:
+                    return
+                user_id, item = entry
+                ok = False
+                try:
+                    ok = await work(item)
+                finally:
+                    latency.checked(owners(item), ok)
+                    in_flight[user_id] -= 1
+                    slot_freed.set()
+                if pause and pending and not self.draining:
+                    await wait_first(pause())  # The pause is cut short by a drain
+
+        await asyncio.gather(*[worker() for _ in range(min(self.concurrency, len(pending)))])
+        return not pending
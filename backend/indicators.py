@@ -0,0 +1,215 @@
+# backend/indicators.py - Incremental per-symbol indicators for stock alerts
+import json
+import math
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from database import DEFAULT_DB_PATH, get_connection
+from migrations import run_migrations
+
+# Alert types backed by indicator state. Their threshold is the period N (in days).
+INDICATOR_ALERT_TYPES = {
+    'sma_cross_above': 'Price crosses above its {n}-day SMA',
+    'sma_cross_below': 'Price crosses below its {n}-day SMA',
+    'ema_cross_above': 'Price crosses above its {n}-day EMA',
+    'ema_cross_below': 'Price crosses below its {n}-day EMA',
+    'new_high': 'New {n}-day high',
+    'new_low': 'New {n}-day low',
+    'bollinger_upper': 'Price breaks above the {n}-day Bollinger band',
+    'bollinger_lower': 'Price breaks below the {n}-day Bollinger band',
+}
+
+MAX_PERIOD = 260  # About one trading year of daily closes
+BOLLINGER_WIDTH = 2.0
+
+
+class IndicatorState:
+    """Indicator state for one symbol, updated in O(1) per price.
+
+    Completed daily closes are kept in a window of up to MAX_PERIOD values. Per-period
+    aggregates over those closes (sum, sum of squares, high, low, EMA) are cached
+    once per day at rollover, so each intraday price only combines the cached
+    aggregates with the current (provisional) close.
+    """
+
+    def __init__(self, day: Optional[str] = None, closes: Optional[List[float]] = None,
+                 ema: Optional[Dict[str, float]] = None, last_price: Optional[float] = None,
+                 previous: Optional[Dict[str, List[float]]] = None):
+        self.day = day
+        self.closes = closes or []
+        self.ema = ema or {}
+        self.last_price = last_price
+        self.previous = previous or {}  # "sma:20" -> [price, indicator] at the previous update
+        self._cache: Dict[int, Dict[str, float]] = {}
+
+    def to_dict(self) -> Dict:
+        return {
+            'day': self.day,
+            'closes': self.closes,
+            'ema': self.ema,
+            'last_price': self.last_price,
+            'previous': self.previous,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'IndicatorState':
+        return cls(data.get('day'), data.get('closes'), data.get('ema'),
+                   data.get('last_price'), data.get('previous'))
+
+    def _roll_day(self, day: str) -> None:
+        """Close out the previous day with its last price and start a new one."""
+        if self.day is not None and self.last_price is not None:
+            close = self.last_price
+            for key, value in list(self.ema.items()):
+                alpha = 2.0 / (int(key) + 1)
+                self.ema[key] = alpha * close + (1 - alpha) * value
+            self.closes.append(close)
+            del self.closes[:-MAX_PERIOD]
+        self.day = day
+        self._cache.clear()
+
+    def _aggregates(self, period: int) -> Optional[Dict[str, float]]:
+        """Cached aggregates over the completed closes that a period-N window needs."""
+        if period in self._cache:
+            return self._cache[period]
+        if len(self.closes) < period:
+            return None
+
+        last = self.closes[-period:]
+        # Today's price fills the N-th slot of the moving window
+        window = last[1:]
+        aggregates = {
+            'sum': sum(window),
+            'sumsq': sum(c * c for c in window),
+            'high': max(last),
+            'low': min(last),
+        }
+
+        key = str(period)
+        if key not in self.ema:
+            self.ema[key] = sum(last) / period  # Seed the EMA with the SMA
+        aggregates['ema'] = self.ema[key]
+
+        self._cache[period] = aggregates
+        return aggregates
+
+    def update(self, price: float, periods: Iterable[int], day: Optional[str] = None) -> Dict[str, Dict[int, bool]]:
+        """Feed one price and get the signals for every requested period."""
+        day = day or datetime.now(timezone.utc).date().isoformat()
+        if day != self.day:
+            self._roll_day(day)
+
+        signals: Dict[str, Dict[int, bool]] = {alert_type: {} for alert_type in INDICATOR_ALERT_TYPES}
+
+        for period in set(periods):
+            if period < 2 or period > MAX_PERIOD:
+                continue
+            aggregates = self._aggregates(period)
+            if aggregates is None:
+                continue  # Not enough history yet
+
+            sma = (aggregates['sum'] + price) / period
+            alpha = 2.0 / (period + 1)
+            ema = alpha * price + (1 - alpha) * aggregates['ema']
+            variance = max((aggregates['sumsq'] + price * price) / period - sma * sma, 0.0)
+            band = BOLLINGER_WIDTH * math.sqrt(variance)
+
+            for name, value in (('sma', sma), ('ema', ema)):
+                key = f"{name}:{period}"
+                previous = self.previous.get(key)
+                if previous:
+                    signals[f'{name}_cross_above'][period] = previous[0] <= previous[1] and price > value
+                    signals[f'{name}_cross_below'][period] = previous[0] >= previous[1] and price < value
+                self.previous[key] = [price, value]
+
+            signals['new_high'][period] = price > aggregates['high']
+            signals['new_low'][period] = price < aggregates['low']
+            signals['bollinger_upper'][period] = price > sma + band
+            signals['bollinger_lower'][period] = price < sma - band
+
+        self.last_price = price
+        return signals
+
+
+class IndicatorStore:
+    """Loads, bootstraps and persists IndicatorState per symbol in stock_indicator_state."""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self.states: Dict[str, IndicatorState] = {}
+        self.init_indicator_table()
+
+    def init_indicator_table(self) -> None:
+        """Create stock_indicator_state (migration 004)."""
+        run_migrations(self.db_path)
+
+    def get_state(self, symbol: str) -> IndicatorState:
+        """Get the state for a symbol, loading it and (re)seeding it from daily bars when it is behind.
+
+        State only advances while a symbol has indicator alerts, so one that sat idle
+        for days is rebuilt from stock_bars_1d rather than averaged across the gap.
+        """
+        today = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+        state = self.states.get(symbol)
+        if state is not None and state.day == today:
+            return state
+
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+
+        if state is None:
+            cursor.execute('SELECT state FROM stock_indicator_state WHERE symbol = ?', (symbol,))
+            row = cursor.fetchone()
+            if row:
+                state = IndicatorState.from_dict(json.loads(row[0]))
+
+        try:
+            cursor.execute('''
+                SELECT MAX(bucket_start) FROM stock_bars_1d WHERE symbol = ? AND bucket_start < ?
+            ''', (symbol, today))
+            latest_bar = cursor.fetchone()[0]
+
+            # First sight of this symbol, or bars closed since its state last moved: seed from the rollups
+            if state is None or (latest_bar and (state.day is None or str(latest_bar)[:10] > state.day)):
+                state = IndicatorState()
+                cursor.execute('''
+                    SELECT close FROM (
+                        SELECT bucket_start, close FROM stock_bars_1d
+                        WHERE symbol = ? AND bucket_start < ?
+                        ORDER BY bucket_start DESC LIMIT ?
+                    ) ORDER BY bucket_start
+                ''', (symbol, today, MAX_PERIOD))
+                state.closes = [r[0] for r in cursor.fetchall()]
+        except sqlite3.OperationalError:
+            pass  # No rollup table yet
+        if state is None:
+            state = IndicatorState()
+
+        conn.close()
+        self.states[symbol] = state
+        return state
+
+    def update(self, symbol: str, price: float, periods: Iterable[int],
+               persist: bool = True) -> Dict[str, Dict[int, bool]]:
+        """Update a symbol's indicators with a new price, persist them and return the signals."""
+        state = self.get_state(symbol)
+        signals = state.update(price, periods)
+        if not persist:
+            return signals
+
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO stock_indicator_state (symbol, state, updated_at)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+        ''', (symbol, json.dumps(state.to_dict())))
+        conn.commit()
+        conn.close()
+
+        return signals
+
+    @staticmethod
+    def check_alert(alert: Dict, signals: Dict[str, Dict[int, bool]]) -> bool:
+        """Check an indicator alert (threshold = period) against update() signals."""
+        return signals.get(alert['alert_type'], {}).get(int(alert['threshold']), False)
@@ -0,0 +1,109 @@
+# backend/leader_lease.py - Lease-based leader election through a SQLite row
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+from database import DEFAULT_DB_PATH, get_connection
+from migrations import run_migrations
+
+
+class LeaderLease:
+    """Time-limited lease on a named role, shared by every process using the database.
+
+    The holder calls try_acquire() every ttl/3 seconds to renew it. If it dies (or
+    hangs) the lease expires after ttl seconds and the next process to try takes it
+    over. Claims run in BEGIN IMMEDIATE transactions, so two processes can't both win.
+    """
+
+    def __init__(self, name: str, db_path: str = DEFAULT_DB_PATH, ttl: float = 60.0):
+        self.name = name
+        self.db_path = db_path
+        self.ttl = ttl
+        self.holder_id = None
+        self._expires_at = 0.0
+        self._leader = threading.Event()
+        run_migrations(db_path)
+
+    def try_acquire(self) -> bool:
+        """Take the lease if it is free or expired, or renew it if we hold it."""
+        if self.holder_id is None:
+            # Set here rather than in __init__ so a forked worker gets its own id
+            self.holder_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        now = time.time()
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT holder, expires_at FROM scheduler_leases WHERE name = ?', (self.name,))
+            row = cursor.fetchone()
+
+            if row and row[0] != self.holder_id and row[1] > now:
+                conn.rollback()
+                acquired = False
+            else:
+                cursor.execute('''
+                    INSERT INTO scheduler_leases (name, holder, acquired_at, expires_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(name) DO UPDATE SET
+                        holder = excluded.holder,
+                        acquired_at = CASE WHEN scheduler_leases.holder = excluded.holder
+                                           THEN scheduler_leases.acquired_at ELSE excluded.acquired_at END,
+                        expires_at = excluded.expires_at
+                ''', (self.name, self.holder_id, now, now + self.ttl))
+                conn.commit()
+                acquired = True
+
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Lease {self.name}: could not reach the lease row: {e}")
+            acquired = False
+        finally:
+            conn.close()
+
+        if acquired:
+            if not self._leader.is_set():
+                print(f"👑 Lease {self.name}: acquired by {self.holder_id}")
+            self._expires_at = now + self.ttl
+            self._leader.set()
+        else:
+            self.is_leader()  # Drops leadership once an unrenewed lease runs out
+        return acquired
+
+    def is_leader(self) -> bool:
+        """True while we hold an unexpired lease (a failed renewal counts until it runs out)."""
+        if self._leader.is_set() and time.time() >= self._expires_at:
+            self._leader.clear()
+            print(f"⚠️ Lease {self.name}: lost by {self.holder_id}")
+        return self._leader.is_set()
+
+    def release(self) -> None:
+        """Give up the lease if we hold it."""
+        if self._leader.is_set():
+            conn = get_connection(self.db_path)
+            conn.execute('DELETE FROM scheduler_leases WHERE name = ? AND holder = ?', (self.name, self.holder_id))
+            conn.commit()
+            conn.close()
+            self._leader.clear()
+            print(f"👋 Lease {self.name}: released by {self.holder_id}")
+
+    def holder(self) -> Optional[Dict]:
+        """Get the current lease row (any process), or None if nobody holds it."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT holder, acquired_at, expires_at FROM scheduler_leases WHERE name = ?', (self.name,))
+        row = cursor.fetchone()
+        conn.close()
+
+        if not row or row[2] <= time.time():
+            return None
+        return {
+            'holder': row[0],
+            'acquired_at': row[1],
+            'expires_in': round(row[2] - time.time(), 1),
+            'is_me': row[0] == self.holder_id
+        }
@@ -0,0 +1,144 @@
+# backend/market_calendar.py - Exchange trading calendar for stock polling
+import json
+from datetime import date, datetime, time, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+CALENDAR_FILE = Path(__file__).parent / 'market_calendar.json'
+
+
+class MarketCalendar:
+    """Regular sessions, early closes and holidays per exchange, loaded from a local data file"""
+
+    def __init__(self, calendar_path: Path = CALENDAR_FILE):
+        with open(calendar_path, 'r') as f:
+            data = json.load(f)
+
+        self.default_exchange = data.get('default_exchange', 'US')
+        self.exchanges: Dict[str, Dict] = {}
+
+        for code, config in data['exchanges'].items():
+            self.exchanges[code] = {
+                'name': config.get('name', code),
+                'tz': ZoneInfo(config.get('timezone', 'UTC')),
+                'always_open': config.get('always_open', False),
+                'open': self._parse_time(config.get('open', '00:00')),
+                'close': self._parse_time(config.get('close', '23:59')),
+                'early_close': self._parse_time(config.get('early_close', config.get('close', '23:59'))),
+                'suffixes': [s.upper() for s in config.get('suffixes', [])],
+                'holidays': {date.fromisoformat(d) for d in config.get('holidays', [])},
+                'early_closes': {date.fromisoformat(d) for d in config.get('early_closes', [])},
+            }
+
+    @staticmethod
+    def _parse_time(value: str) -> time:
+        hours, minutes = value.split(':')
+        return time(int(hours), int(minutes))
+
+    def exchange_for_symbol(self, symbol: str) -> str:
+        """Map a Yahoo-style symbol (AAPL, SHOP.TO, VOD.L, BTC-USD) to its exchange code"""
+        symbol = symbol.upper().strip()
+        for code, config in self.exchanges.items():
+            if any(symbol.endswith(suffix) for suffix in config['suffixes']):
+                return code
+        return self.default_exchange
+
+    def group_symbols_by_exchange(self, symbols: Iterable[str]) -> Dict[str, List[str]]:
+        """Group symbols by the exchange whose calendar they follow"""
+        grouped: Dict[str, List[str]] = {}
+        for symbol in symbols:
+            grouped.setdefault(self.exchange_for_symbol(symbol), []).append(symbol)
+        return grouped
+
+    def session_for(self, exchange: str, day: date) -> Optional[Tuple[datetime, datetime]]:
+        """Get the (open, close) of a trading day as aware datetimes, or None if closed all day"""
+        config = self.exchanges[exchange]
+        tz = config['tz']
+
+        if config['always_open']:
+            start = datetime.combine(day, time(0, 0), tzinfo=tz)
+            return start, start + timedelta(days=1)
+
+        if day.weekday() >= 5 or day in config['holidays']:
+            return None
+
+        close_time = config['early_close'] if day in config['early_closes'] else config['close']
+        return (
+            datetime.combine(day, config['open'], tzinfo=tz),
+            datetime.combine(day, close_time, tzinfo=tz),
+        )
+
+    def _local_now(self, exchange: str, now: Optional[datetime]) -> datetime:
+        tz = self.exchanges[exchange]['tz']
+        if now is None:
+            return datetime.now(tz)
+        if now.tzinfo is None:
+            # Naive datetimes are treated as server local time
+            now = now.astimezone()
+        return now.astimezone(tz)
+
+    def is_open(self, exchange: str, now: Optional[datetime] = None) -> bool:
+        """Check if the exchange is in its regular session right now"""
+        local_now = self._local_now(exchange, now)
+        session = self.session_for(exchange, local_now.date())
+        return session is not None and session[0] <= local_now < session[1]
+
+    def last_close(self, exchange: str, now: Optional[datetime] = None) -> Optional[datetime]:
+        """Get the most recent session close at or before now (looks back up to two weeks)"""
+        local_now = self._local_now(exchange, now)
+        for days_back in range(15):
+            session = self.session_for(exchange, local_now.date() - timedelta(days=days_back))
+            if session and session[1] <= local_now:
+                return session[1]
+        return None
+
+    def next_open(self, exchange: str, now: Optional[datetime] = None) -> Optional[datetime]:
+        """Get the next session open after now (looks ahead up to two weeks)"""
+        local_now = self._local_now(exchange, now)
+        for days_ahead in range(15):
+            session = self.session_for(exchange, local_now.date() + timedelta(days=days_ahead))
+            if session and session[0] > local_now:
+                return session[0]
+        return None
+
+    def should_poll(self, exchange: str, last_polled: Optional[datetime], now: Optional[datetime] = None) -> bool:
+        """Poll while the session is open, plus one post-close snapshot after each close"""
+        if self.is_open(exchange, now):
+            return True
+
+        closed_at = self.last_close(exchange, now)
+        if closed_at is None:
+            return False
+        if last_polled is None:
+            return True
+        if last_polled.tzinfo is None:
+            last_polled = last_polled.astimezone()
+        return last_polled < closed_at
+
+    def due_symbols(self, symbols: Iterable[str], last_polled: Dict[str, datetime],
+                    now: Optional[datetime] = None) -> Dict[str, List[str]]:
+        """Get the symbols that need a quote now, grouped by exchange"""
+        due: Dict[str, List[str]] = {}
+        for exchange, exchange_symbols in self.group_symbols_by_exchange(symbols).items():
+            if self.should_poll(exchange, last_polled.get(exchange), now):
+                due[exchange] = exchange_symbols
+        return due
+
+
+# Test function to verify the calendar data
+def test_market_calendar():
+    """Print the current state of every configured exchange."""
+    calendar = MarketCalendar()
+    now = datetime.now().astimezone()
+
+    for code, config in calendar.exchanges.items():
+        status = "OPEN" if calendar.is_open(code, now) else "closed"
+        print(f"{config['name']:<25} {status:<7} last close: {calendar.last_close(code, now)}  next open: {calendar.next_open(code, now)}")
+
+    for symbol in ["AAPL", "SHOP.TO", "VOD.L", "BTC-USD"]:
+        print(f"{symbol} -> {calendar.exchange_for_symbol(symbol)}")
+
+
+if __name__ == "__main__":
+    test_market_calendar()
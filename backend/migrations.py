@@ -0,0 +1,535 @@
+# backend/migrations.py - Versioned schema migrations and query-plan checks
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from typing import Callable, List, Set, Tuple
+
+from database import DEFAULT_DB_PATH, get_connection
+from price_stats import backfill_price_stats
+
+
+def _initial_schema(cursor: sqlite3.Cursor) -> None:
+    """Core tables, as created by the pre-migration init functions."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            first_name TEXT NOT NULL,
+            last_name TEXT,
+            smtp_password TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tracked_products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            url TEXT NOT NULL,
+            platform TEXT,
+            title TEXT,
+            target_price REAL NOT NULL,
+            last_price REAL,
+            last_checked TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, url)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            price REAL,
+            checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES tracked_products (id)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            symbol TEXT NOT NULL,
+            company_name TEXT,
+            alert_type TEXT NOT NULL,
+            threshold REAL NOT NULL,
+            current_price REAL,
+            last_checked TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_triggered BOOLEAN DEFAULT 0,
+            UNIQUE(user_id, symbol, alert_type, threshold)
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_price_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            symbol TEXT NOT NULL,
+            price REAL NOT NULL,
+            volume INTEGER,
+            change_percent REAL,
+            market_cap TEXT,
+            checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _legacy_user_id_columns(cursor: sqlite3.Cursor) -> None:
+    """Databases from the single-user version lack user_id; give old rows to user 1."""
+    for table in ('tracked_products', 'stock_alerts'):
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [column[1] for column in cursor.fetchall()]
+        if 'user_id' not in columns:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN user_id INTEGER DEFAULT 1')
+            print(f"✅ Migrated database: Added user_id column to {table}")
+
+
+def _stock_history_rollups(cursor: sqlite3.Cursor) -> None:
+    """OHLCV bar tables and the raw-id watermark used by StockHistoryStore."""
+    for table in ('stock_bars_5m', 'stock_bars_1h', 'stock_bars_1d'):
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                symbol TEXT NOT NULL,
+                bucket_start TIMESTAMP NOT NULL,
+                open REAL NOT NULL,
+                high REAL NOT NULL,
+                low REAL NOT NULL,
+                close REAL NOT NULL,
+                volume INTEGER,
+                samples INTEGER NOT NULL,
+                PRIMARY KEY (symbol, bucket_start)
+            )
+        ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_rollup_state (
+            name TEXT PRIMARY KEY,
+            last_raw_id INTEGER NOT NULL
+        )
+    ''')
+
+
+def _stock_indicator_state(cursor: sqlite3.Cursor) -> None:
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_indicator_state (
+            symbol TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _hot_query_indexes(cursor: sqlite3.Cursor) -> None:
+    """Indexes for every query on the request and scheduler paths (see HOT_QUERIES)."""
+    statements = [
+        # Product history reads and delete_product's history delete (covering)
+        'CREATE INDEX IF NOT EXISTS idx_price_history_product_time ON price_history (product_id, checked_at, price)',
+        # get_tracked_products: WHERE user_id = ? ORDER BY created_at DESC
+        'CREATE INDEX IF NOT EXISTS idx_tracked_products_user_created ON tracked_products (user_id, created_at)',
+        # get_all_products_for_checking: ORDER BY created_at DESC
+        'CREATE INDEX IF NOT EXISTS idx_tracked_products_created ON tracked_products (created_at)',
+        # get_stock_alerts: WHERE user_id = ? ORDER BY created_at DESC
+        'CREATE INDEX IF NOT EXISTS idx_stock_alerts_user_created ON stock_alerts (user_id, created_at)',
+        # get_all_alerts_for_checking: ORDER BY created_at DESC
+        'CREATE INDEX IF NOT EXISTS idx_stock_alerts_created ON stock_alerts (created_at)',
+        # update_stock_info: UPDATE ... WHERE symbol = ?
+        'CREATE INDEX IF NOT EXISTS idx_stock_alerts_symbol ON stock_alerts (symbol)',
+        # get_active_symbols: SELECT DISTINCT symbol WHERE is_triggered = 0 (covering)
+        'CREATE INDEX IF NOT EXISTS idx_stock_alerts_triggered_symbol ON stock_alerts (is_triggered, symbol)',
+        # Rollups, chart queries and delete_stock_alert's history delete
+        'CREATE INDEX IF NOT EXISTS idx_stock_price_history_symbol_time ON stock_price_history (symbol, checked_at)',
+    ]
+    for statement in statements:
+        cursor.execute(statement)
+
+
+def _price_history_runs(cursor: sqlite3.Cursor) -> None:
+    """Store product prices as change-point runs: one row per price level instead of one per check.
+
+    Existing history is compressed into runs, and price_history becomes a view that
+    expands each run back into its first and last check for older readers.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS price_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER NOT NULL,
+            price REAL NOT NULL,
+            first_seen TIMESTAMP NOT NULL,
+            last_seen TIMESTAMP NOT NULL,
+            check_count INTEGER NOT NULL DEFAULT 1,
+            FOREIGN KEY (product_id) REFERENCES tracked_products (id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_price_runs_product_time ON price_runs (product_id, last_seen)
+    ''')
+
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = 'price_history'")
+    row = cursor.fetchone()
+    if row and row[0] == 'table':
+        # Consecutive checks at the same price form one run (gaps-and-islands)
+        cursor.execute('''
+            INSERT INTO price_runs (product_id, price, first_seen, last_seen, check_count)
+            SELECT product_id, price, MIN(checked_at), MAX(checked_at), COUNT(*)
+            FROM (
+                SELECT product_id, price, checked_at,
+                       ROW_NUMBER() OVER (PARTITION BY product_id ORDER BY checked_at, id)
+                       - ROW_NUMBER() OVER (PARTITION BY product_id, price ORDER BY checked_at, id) AS island
+                FROM price_history
+                WHERE product_id IS NOT NULL AND price IS NOT NULL AND checked_at IS NOT NULL
+            )
+            GROUP BY product_id, price, island
+            ORDER BY product_id, MIN(checked_at)
+        ''')
+        runs = cursor.rowcount
+        cursor.execute('SELECT COUNT(*) FROM price_history')
+        checks = cursor.fetchone()[0]
+        cursor.execute('DROP TABLE price_history')
+        print(f"✅ Compressed {checks} price_history rows into {runs} price runs")
+
+    cursor.execute('''
+        CREATE VIEW IF NOT EXISTS price_history (id, product_id, price, checked_at) AS
+        SELECT id * 2, product_id, price, first_seen FROM price_runs
+        UNION ALL
+        SELECT id * 2 + 1, product_id, price, last_seen FROM price_runs WHERE check_count > 1
+    ''')
+
+
+def _product_price_stats(cursor: sqlite3.Cursor) -> None:
+    """Running per-product price statistics (see price_stats.PriceStats), backfilled from price_runs."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_price_stats (
+            product_id INTEGER PRIMARY KEY,
+            min_price REAL,
+            max_price REAL,
+            check_count INTEGER NOT NULL DEFAULT 0,
+            price_sum REAL NOT NULL DEFAULT 0,
+            ewma REAL,
+            window_low REAL,
+            last_price REAL,
+            last_change_at TIMESTAMP,
+            window_ring TEXT NOT NULL,
+            FOREIGN KEY (product_id) REFERENCES tracked_products (id)
+        )
+    ''')
+    products = backfill_price_stats(cursor)
+    print(f"✅ Built price statistics for {products} products")
+
+
+def _user_stats(cursor: sqlite3.Cursor) -> None:
+    """Per-user dashboard counters for /api/stats, kept current by triggers on every write path."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            total_products INTEGER NOT NULL DEFAULT 0,
+            products_below_target INTEGER NOT NULL DEFAULT 0,
+            total_savings REAL NOT NULL DEFAULT 0,
+            total_stock_alerts INTEGER NOT NULL DEFAULT 0,
+            triggered_stock_alerts INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    # A product counts towards savings once it has a price at or below its target
+    below = 'CASE WHEN {row}.last_price IS NOT NULL AND {row}.last_price <= {row}.target_price THEN 1 ELSE 0 END'
+    savings = ('CASE WHEN {row}.last_price IS NOT NULL AND {row}.last_price <= {row}.target_price '
+               'THEN {row}.target_price - {row}.last_price ELSE 0 END')
+
+    def add_product(row: str, sign: str) -> str:
+        return f'''
+            INSERT OR IGNORE INTO user_stats (user_id) VALUES ({row}.user_id);
+            UPDATE user_stats
+            SET total_products = total_products {sign} 1,
+                products_below_target = products_below_target {sign} {below.format(row=row)},
+                total_savings = total_savings {sign} {savings.format(row=row)}
+            WHERE user_id = {row}.user_id;
+        '''
+
+    def add_alert(row: str, sign: str) -> str:
+        return f'''
+            INSERT OR IGNORE INTO user_stats (user_id) VALUES ({row}.user_id);
+            UPDATE user_stats
+            SET total_stock_alerts = total_stock_alerts {sign} 1,
+                triggered_stock_alerts = triggered_stock_alerts {sign} (CASE WHEN {row}.is_triggered THEN 1 ELSE 0 END)
+            WHERE user_id = {row}.user_id;
+        '''
+
+    triggers = {
+        'user_stats_product_insert': ('AFTER INSERT ON tracked_products', add_product('NEW', '+')),
+        'user_stats_product_delete': ('AFTER DELETE ON tracked_products', add_product('OLD', '-')),
+        'user_stats_product_update': ('AFTER UPDATE OF user_id, target_price, last_price ON tracked_products',
+                                      add_product('OLD', '-') + add_product('NEW', '+')),
+        'user_stats_alert_insert': ('AFTER INSERT ON stock_alerts', add_alert('NEW', '+')),
+        'user_stats_alert_delete': ('AFTER DELETE ON stock_alerts', add_alert('OLD', '-')),
+        'user_stats_alert_update': ('AFTER UPDATE OF user_id, is_triggered ON stock_alerts',
+                                    add_alert('OLD', '-') + add_alert('NEW', '+')),
+    }
+    for name, (event, body) in triggers.items():
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {event} BEGIN {body} END')
+
+    # Backfill from the current rows
+    cursor.execute(f'''
+        INSERT OR REPLACE INTO user_stats (user_id, total_products, products_below_target, total_savings,
+                                           total_stock_alerts, triggered_stock_alerts)
+        SELECT user_id, SUM(products), SUM(below), SUM(savings), SUM(alerts), SUM(triggered)
+        FROM (
+            SELECT user_id, 1 AS products, {below.format(row='p')} AS below, {savings.format(row='p')} AS savings,
+                   0 AS alerts, 0 AS triggered
+            FROM tracked_products p
+            UNION ALL
+            SELECT user_id, 0, 0, 0, 1, CASE WHEN is_triggered THEN 1 ELSE 0 END
+            FROM stock_alerts
+        )
+        GROUP BY user_id
+    ''')
+
+
+def _scheduler_leases(cursor: sqlite3.Cursor) -> None:
+    """Leader leases (see leader_lease.LeaderLease); times are Unix timestamps."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_leases (
+            name TEXT PRIMARY KEY,
+            holder TEXT NOT NULL,
+            acquired_at REAL NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+
+
+def _scheduler_runs(cursor: sqlite3.Cursor) -> None:
+    """One row per scheduled job run (see scheduler_runs.SchedulerRunLog); times are Unix timestamps."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job TEXT NOT NULL,
+            holder TEXT,
+            status TEXT NOT NULL,
+            started_at REAL NOT NULL,
+            finished_at REAL,
+            items INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            overrun BOOLEAN NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_scheduler_runs_job_started ON scheduler_runs (job, started_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_scheduler_runs_started ON scheduler_runs (started_at)')
+
+
+def _scheduler_jobs(cursor: sqlite3.Cursor) -> None:
+    """Last run and next due time of each scheduled job, so a restarted scheduler keeps its cadence."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS scheduler_jobs (
+            name TEXT PRIMARY KEY,
+            last_run REAL,
+            next_due REAL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+
+
+def _user_check_latency(cursor: sqlite3.Cursor) -> None:
+    """Per-user outcome of the latest product and stock check run (see fair_share.UserLatency)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_check_latency (
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            run_at REAL NOT NULL,
+            checked INTEGER NOT NULL DEFAULT 0,
+            failed INTEGER NOT NULL DEFAULT 0,
+            deferred INTEGER NOT NULL DEFAULT 0,
+            avg_latency REAL,
+            p95_latency REAL,
+            max_latency REAL,
+            PRIMARY KEY (user_id, kind)
+        )
+    ''')
+
+
+def _check_run_checkpoints(cursor: sqlite3.Cursor) -> None:
+    """Open check runs and the items each has finished, so an interrupted run can resume."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS check_runs (
+            job TEXT PRIMARY KEY,
+            started_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS check_run_items (
+            job TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            done_at REAL NOT NULL,
+            PRIMARY KEY (job, item_id)
+        )
+    ''')
+
+
+def _product_failures(cursor: sqlite3.Cursor) -> None:
+    """Consecutive scrape failures per product and when to check it next (see quarantine.py)."""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS product_failures (
+            product_id INTEGER PRIMARY KEY,
+            consecutive_failures INTEGER NOT NULL,
+            failure_class TEXT NOT NULL,
+            last_failure_at REAL NOT NULL,
+            next_check_at REAL,
+            FOREIGN KEY (product_id) REFERENCES tracked_products (id)
+        )
+    ''')
+
+
+# (version, name, migration). Append only: never edit or reorder an applied migration.
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, 'initial_schema', _initial_schema),
+    (2, 'legacy_user_id_columns', _legacy_user_id_columns),
+    (3, 'stock_history_rollups', _stock_history_rollups),
+    (4, 'stock_indicator_state', _stock_indicator_state),
+    (5, 'hot_query_indexes', _hot_query_indexes),
+    (6, 'price_history_runs', _price_history_runs),
+    (7, 'product_price_stats', _product_price_stats),
+    (8, 'user_stats', _user_stats),
+    (9, 'scheduler_leases', _scheduler_leases),
+    (10, 'scheduler_runs', _scheduler_runs),
+    (11, 'scheduler_jobs', _scheduler_jobs),
+    (12, 'user_check_latency', _user_check_latency),
+    (13, 'check_run_checkpoints', _check_run_checkpoints),
+    (14, 'product_failures', _product_failures),
+]
+
+_migrated_paths: Set[str] = set()
+_migrate_lock = threading.Lock()
+
+
+def run_migrations(db_path: str = DEFAULT_DB_PATH) -> int:
+    """Apply every pending migration in order. Returns how many were applied.
+
+    Each migration runs in its own BEGIN IMMEDIATE transaction together with its
+    schema_migrations row, so concurrent processes can't apply one twice.
+    """
+    with _migrate_lock:
+        if db_path in _migrated_paths:
+            return 0
+
+        conn = get_connection(db_path)
+        cursor = conn.cursor()
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.commit()
+
+        cursor.execute('SELECT version FROM schema_migrations')
+        applied_versions = {row[0] for row in cursor.fetchall()}
+        applied = 0
+
+        for version, name, migrate in MIGRATIONS:
+            if version in applied_versions:
+                continue
+
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                # Another process may have applied it while we waited for the lock
+                cursor.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (version,))
+                if cursor.fetchone():
+                    conn.rollback()
+                    continue
+
+                migrate(cursor)
+                cursor.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (version, name))
+                conn.commit()
+                applied += 1
+                print(f"✅ Applied migration {version:03d}_{name}")
+
+            except Exception:
+                conn.rollback()
+                raise
+
+        conn.close()
+        _migrated_paths.add(db_path)
+        return applied
+
+
+# Hot queries and the index each one must use. check_query_plans() fails if a
+# schema change makes any of them fall back to a table scan or a different index.
+HOT_QUERIES = [
+    ('product price runs in range',
+     'SELECT price, first_seen, last_seen FROM price_runs '
+     'WHERE product_id = ? AND last_seen >= ? AND first_seen <= ? ORDER BY last_seen, id',
+     (1, '2024-01-01', '2025-01-01'), 'idx_price_runs_product_time'),
+    ('current price run',
+     'SELECT id, price FROM price_runs WHERE product_id = ? ORDER BY last_seen DESC, id DESC LIMIT 1',
+     (1,), 'idx_price_runs_product_time'),
+    ('delete_product history delete',
+     'DELETE FROM price_runs WHERE product_id IN (SELECT id FROM tracked_products WHERE id = ? AND user_id = ?)',
+     (1, 1), 'idx_price_runs_product_time'),
+    ('get_tracked_products',
+     'SELECT p.id, p.url, p.last_price, s.min_price, s.window_low, f.next_check_at FROM tracked_products p '
+     'LEFT JOIN product_price_stats s ON s.product_id = p.id '
+     'LEFT JOIN product_failures f ON f.product_id = p.id WHERE p.user_id = ? ORDER BY p.created_at DESC',
+     (1,), 'idx_tracked_products_user_created'),
+    ('get_all_products_for_checking',
+     'SELECT p.id, u.email, f.next_check_at FROM tracked_products p JOIN users u ON p.user_id = u.id '
+     'LEFT JOIN product_failures f ON f.product_id = p.id ORDER BY p.created_at DESC',
+     (), 'idx_tracked_products_created'),
+    ('get_stock_alerts',
+     'SELECT id, symbol, alert_type, threshold FROM stock_alerts WHERE user_id = ? ORDER BY created_at DESC',
+     (1,), 'idx_stock_alerts_user_created'),
+    ('get_all_alerts_for_checking',
+     'SELECT a.id, u.email FROM stock_alerts a JOIN users u ON a.user_id = u.id ORDER BY a.created_at DESC',
+     (), 'idx_stock_alerts_created'),
+    ('update_stock_info',
+     'UPDATE stock_alerts SET current_price = ? WHERE symbol = ?',
+     (1.0, 'AAPL'), 'idx_stock_alerts_symbol'),
+    ('get_active_symbols',
+     'SELECT DISTINCT symbol FROM stock_alerts WHERE is_triggered = 0',
+     (), 'idx_stock_alerts_triggered_symbol'),
+    ('stock history range',
+     'SELECT checked_at, price FROM stock_price_history WHERE symbol = ? AND checked_at >= ? ORDER BY checked_at',
+     ('AAPL', '2024-01-01'), 'idx_stock_price_history_symbol_time'),
+    ('delete_stock_alert history delete',
+     'DELETE FROM stock_price_history WHERE symbol IN (SELECT symbol FROM stock_alerts WHERE id = ? AND user_id = ?)',
+     (1, 1), 'idx_stock_price_history_symbol_time'),
+    ('get_user_stats',
+     'SELECT total_products, total_savings FROM user_stats WHERE user_id = ?',
+     (1,), 'PRIMARY KEY'),
+    ('recent scheduler runs',
+     'SELECT job, status, started_at FROM scheduler_runs WHERE job = ? ORDER BY started_at DESC LIMIT 50',
+     ('products',), 'idx_scheduler_runs_job_started'),
+    ('login',
+     'SELECT id FROM users WHERE email = ? AND password_hash = ?',
+     ('a@example.com', 'x'), 'sqlite_autoindex_users_1'),
+]
+
+
+def check_query_plans(db_path: str = DEFAULT_DB_PATH) -> List[str]:
+    """EXPLAIN QUERY PLAN every hot query and return a failure message per regression."""
+    run_migrations(db_path)
+    conn = get_connection(db_path)
+    cursor = conn.cursor()
+    failures = []
+
+    for name, sql, params, expected_index in HOT_QUERIES:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        plan = [row[3] for row in cursor.fetchall()]
+        if not any(expected_index in step for step in plan):
+            failures.append(f"{name}: expected {expected_index}, got plan {plan}")
+
+    conn.close()
+    return failures
+
+
+if __name__ == "__main__":
+    # Check the plans against a fresh database built from the migrations
+    with tempfile.TemporaryDirectory() as tmp:
+        failures = check_query_plans(os.path.join(tmp, 'plans.db'))
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    print(f"{len(HOT_QUERIES) - len(failures)}/{len(HOT_QUERIES)} hot queries use their index")
+    sys.exit(1 if failures else 0)
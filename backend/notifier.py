@@ -0,0 +1,283 @@
+# backend/notifier.py - Alert emails over reused, authenticated SMTP connections
+import asyncio
+import functools
+import os
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from typing import Dict, Optional
+
+SMTP_HOST = 'smtp.gmail.com'
+SMTP_PORT = 587
+# Gmail closes connections idle for a few minutes; reconnect before that instead of failing a send
+IDLE_TIMEOUT = 240
+
+
+class _Account:
+    """One sender account's connection. The lock keeps it to one send at a time."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.server: Optional[smtplib.SMTP] = None
+        self.password: Optional[str] = None
+        self.last_used = 0.0
+
+
+class SMTPSender:
+    """Sends alert emails on its own threads, keeping one logged-in connection per sender account.
+
+    Every user sends their alerts from their own Gmail account, so connections are
+    keyed by account: the first alert of a run pays for connect + STARTTLS + login,
+    and the following alerts from that account reuse the connection. A connection
+    idle for longer than idle_timeout, or one the server has dropped, is replaced
+    (a send on a dropped reused connection is retried once on a fresh one). close()
+    logs out of every connection not in use, at the end of a check run.
+    """
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, starttls: bool = True,
+                 idle_timeout: float = IDLE_TIMEOUT, timeout: float = 30, max_workers: int = 4):
+        self.host = host
+        self.port = port
+        self.starttls = starttls
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._accounts: Dict[str, _Account] = {}
+        self.connects = 0
+        self.sent = 0
+        self.reused = 0
+        self._reset()
+
+    async def send(self, msg: Message, user: str, password: str) -> None:
+        """Await send_sync(msg, user, password) on the sender's threads."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, functools.partial(self.send_sync, msg, user, password))
+
+    def send_sync(self, msg: Message, user: str, password: str) -> None:
+        """Send msg from the user's account, reusing its connection if one is open. Raises on failure."""
+        account = self._account(user)
+        with account.lock:
+            reused = self._connect(account, user, password)
+            try:
+                account.server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                self._disconnect(account)
+                if not reused:
+                    raise
+                print(f"🔌 SMTP connection for {user} was dropped ({e}) - reconnecting")
+                self._connect(account, user, password)
+                account.server.send_message(msg)
+            except Exception:
+                self._disconnect(account)  # Don't reuse a connection left mid-transaction
+                raise
+
+            account.last_used = time.time()
+            with self._lock:
+                self.sent += 1
+                self.reused += reused
+
+    async def close(self) -> int:
+        """Await close_sync() on the sender's threads."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.close_sync)
+
+    def close_sync(self) -> int:
+        """Log out of every open connection that isn't mid-send. Returns how many were closed."""
+        with self._lock:
+            accounts = list(self._accounts.values())
+        closed = 0
+        for account in accounts:
+            if account.server and account.lock.acquire(blocking=False):
+                try:
+                    if account.server:
+                        self._disconnect(account)
+                        closed += 1
+                finally:
+                    account.lock.release()
+        return closed
+
+    def stats(self) -> Dict[str, int]:
+        """Get the connection counters (reused = sends that skipped connect and login)."""
+        with self._lock:
+            return {
+                'connects': self.connects,
+                'sent': self.sent,
+                'reused': self.reused,
+                'open': sum(1 for account in self._accounts.values() if account.server),
+            }
+
+    def _account(self, user: str) -> _Account:
+        with self._lock:
+            account = self._accounts.get(user)
+            if account is None:
+                account = self._accounts[user] = _Account()
+            return account
+
+    def _connect(self, account: _Account, user: str, password: str) -> bool:
+        """Make sure account.server is logged in. Returns True if an open connection was reused."""
+        if account.server:
+            if account.password == password and time.time() - account.last_used < self.idle_timeout:
+                return True
+            self._disconnect(account)  # Idle too long (the server may have hung up) or new password
+
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                server.starttls()
+            server.login(user, password)
+        except Exception:
+            server.close()
+            raise
+
+        account.server = server
+        account.password = password
+        account.last_used = time.time()
+        with self._lock:
+            self.connects += 1
+        return False
+
+    def _disconnect(self, account: _Account) -> None:
+        server, account.server = account.server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            server.close()  # Already gone; just drop the socket
+
+    def _reset(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='smtp')
+        self._accounts = {}
+
+
+# Shared by the product and stock trackers
+alert_sender = SMTPSender()
+
+if hasattr(os, 'register_at_fork'):
+    # A forked worker inherits the executor but none of its threads, and must not share the parent's sockets
+    os.register_at_fork(after_in_child=alert_sender._reset)
+
+
+if __name__ == '__main__':
+    # Self-check against a local SMTP stand-in (no TLS): connections are reused per account,
+    # re-established when the server drops them, and sending doesn't block the event loop.
+    import base64
+    import socketserver
+    from email.mime.text import MIMEText
+
+    class StandInSMTPHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            server = self.server
+            with server.lock:
+                server.connections += 1
+            self.wfile.write(b'220 localhost stand-in\r\n')
+            user = None
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                command = line.decode().strip()
+                verb = command.split(' ')[0].upper()
+                if verb in ('EHLO', 'HELO'):
+                    self.wfile.write(b'250-localhost\r\n250 AUTH PLAIN\r\n')
+                elif verb == 'AUTH':
+                    _, user, password = base64.b64decode(command.split(' ')[2]).decode().split('\0')
+                    if password != 'app-password':
+                        self.wfile.write(b'535 Bad credentials\r\n')
+                        continue
+                    with server.lock:
+                        server.logins += 1
+                    self.wfile.write(b'235 OK\r\n')
+                elif verb == 'DATA':
+                    self.wfile.write(b'354 Go ahead\r\n')
+                    while self.rfile.readline() not in (b'.\r\n', b''):
+                        pass
+                    time.sleep(server.delay)
+                    with server.lock:
+                        server.messages.append(user)
+                        drop = server.drop_after and len(server.messages) % server.drop_after == 0
+                    self.wfile.write(b'250 Queued\r\n')
+                    if drop:
+                        return  # Hang up without QUIT, like a server timing out an idle client
+                elif verb == 'QUIT':
+                    self.wfile.write(b'221 Bye\r\n')
+                    return
+                else:
+                    self.wfile.write(b'250 OK\r\n')
+
+    class StandInSMTPServer(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+        def __init__(self):
+            super().__init__(('127.0.0.1', 0), StandInSMTPHandler)
+            self.lock = threading.Lock()
+            self.connections = 0
+            self.logins = 0
+            self.messages = []
+            self.delay = 0.0
+            self.drop_after = 0
+
+    def alert(user: str, n: int) -> MIMEText:
+        msg = MIMEText(f'Alert {n}')
+        msg['From'] = msg['To'] = user
+        msg['Subject'] = f'Alert {n}'
+        return msg
+
+    async def main():
+        server = StandInSMTPServer()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        sender = SMTPSender('127.0.0.1', server.server_address[1], starttls=False)
+
+        # 1. Several alerts from two accounts in one run: one connection + login each
+        users = ['alice@example.com', 'bob@example.com']
+        for n in range(6):
+            await sender.send(alert(users[n % 2], n), users[n % 2], 'app-password')
+        assert len(server.messages) == 6, server.messages
+        assert server.connections == 2 and server.logins == 2, (server.connections, server.logins)
+        assert sender.stats()['reused'] == 4, sender.stats()
+        print(f"✅ 6 alerts from 2 accounts over {server.connections} connections")
+
+        # 2. Off the event loop: a slow server doesn't stop other coroutines running
+        server.delay = 0.2
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.ensure_future(ticker())
+        await asyncio.gather(*[sender.send(alert(user, 9), user, 'app-password') for user in users])
+        ticking.cancel()
+        assert ticks >= 10, ticks
+        server.delay = 0.0
+        print(f"✅ Event loop ticked {ticks} times during 2 slow sends")
+
+        # 3. The server hangs up after a message: the next send reconnects and goes through
+        server.drop_after = len(server.messages) + 1
+        await sender.send(alert(users[0], 10), users[0], 'app-password')  # Server drops it after this one
+        await sender.send(alert(users[0], 11), users[0], 'app-password')
+        assert len(server.messages) == 10 and server.logins == 3, (len(server.messages), server.logins)
+        server.drop_after = 0
+        print("✅ Dropped connection replaced transparently")
+
+        # 4. Bad password raises, and the account's connection isn't kept
+        try:
+            await sender.send(alert('carol@example.com', 12), 'carol@example.com', 'wrong')
+            raise AssertionError('login should have failed')
+        except smtplib.SMTPAuthenticationError:
+            pass
+        print("✅ Authentication failure raised to the caller")
+
+        # 5. End of run: connections are logged out
+        closed = await sender.close()
+        assert sender.stats()['open'] == 0, sender.stats()
+        print(f"✅ close() logged out of {closed} connections; stats: {sender.stats()}")
+        server.shutdown()
+
+    asyncio.run(main())
@@ -0,0 +1,155 @@
+# backend/price_stats.py - Per-product price statistics maintained in O(1) per check
+import json
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+WINDOW_DAYS = 30    # Rolling window for the "30-day low"
+EWMA_ALPHA = 0.1    # Weight of the newest check in the moving average
+SQL_VARIABLE_CHUNK = 500  # product_ids per IN (...) query, well under SQLite's variable limit
+
+
+class PriceStats:
+    """Running statistics for one product's checks.
+
+    min/max/count/sum give the all-time low, high and average, ewma a smoothed
+    typical price, and the window low comes from a ring of WINDOW_DAYS daily lows
+    indexed by day number, so every update touches a fixed amount of state.
+    """
+
+    def __init__(self, min_price: Optional[float] = None, max_price: Optional[float] = None,
+                 check_count: int = 0, price_sum: float = 0.0, ewma: Optional[float] = None,
+                 last_price: Optional[float] = None, last_change_at: Optional[str] = None,
+                 ring: Optional[List[List[float]]] = None):
+        self.min_price = min_price
+        self.max_price = max_price
+        self.check_count = check_count
+        self.price_sum = price_sum
+        self.ewma = ewma
+        self.last_price = last_price
+        self.last_change_at = last_change_at
+        self.ring = ring or [[-1, 0.0] for _ in range(WINDOW_DAYS)]  # slot -> [day ordinal, low]
+
+    @staticmethod
+    def day_number(checked_at: str) -> int:
+        return datetime.strptime(checked_at[:10], '%Y-%m-%d').toordinal()
+
+    def add(self, price: float, checked_at: str, repeat: int = 1) -> None:
+        """Add `repeat` checks at the same price (repeat > 1 is only used when backfilling from runs)."""
+        self.min_price = price if self.min_price is None else min(self.min_price, price)
+        self.max_price = price if self.max_price is None else max(self.max_price, price)
+        self.check_count += repeat
+        self.price_sum += price * repeat
+        if self.ewma is None:
+            self.ewma = price
+        else:
+            self.ewma = price + (self.ewma - price) * (1 - EWMA_ALPHA) ** repeat
+
+        if self.last_price != price:
+            self.last_change_at = checked_at
+        self.last_price = price
+
+        self.record_low(self.day_number(checked_at), price)
+
+    def record_low(self, day: int, price: float) -> None:
+        """Fold a price into the ring slot for `day`, replacing the day that slot held WINDOW_DAYS ago."""
+        slot = self.ring[day % WINDOW_DAYS]
+        if slot[0] != day:
+            slot[0], slot[1] = day, price
+        elif price < slot[1]:
+            slot[1] = price
+
+    def window_low(self, today: int) -> Optional[float]:
+        """Lowest price seen in the WINDOW_DAYS days up to and including day `today`."""
+        lows = [low for day, low in self.ring if today - WINDOW_DAYS < day <= today]
+        return min(lows) if lows else None
+
+    def to_row(self, product_id: int, today: int) -> tuple:
+        return (product_id, self.min_price, self.max_price, self.check_count, self.price_sum, self.ewma,
+                self.window_low(today), self.last_price, self.last_change_at, json.dumps(self.ring))
+
+    @classmethod
+    def from_row(cls, row: tuple) -> 'PriceStats':
+        min_price, max_price, check_count, price_sum, ewma, last_price, last_change_at, ring = row
+        return cls(min_price, max_price, check_count, price_sum, ewma, last_price, last_change_at, json.loads(ring))
+
+
+def save_price_stats(cursor: sqlite3.Cursor, rows: List[tuple]) -> None:
+    """Write PriceStats.to_row() rows in one executemany."""
+    cursor.executemany('''
+        INSERT OR REPLACE INTO product_price_stats
+        (product_id, min_price, max_price, check_count, price_sum, ewma, window_low,
+         last_price, last_change_at, window_ring)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+
+def update_price_stats(cursor: sqlite3.Cursor, checks: List[Tuple[int, float, str]]) -> None:
+    """Fold a batch of (product_id, price, checked_at) checks into product_price_stats.
+
+    Each product's row is read once and written once however many of its checks
+    are in the batch; the checks are applied in order in memory in between.
+    """
+    product_ids = list(dict.fromkeys(product_id for product_id, _, _ in checks))
+    all_stats: Dict[int, PriceStats] = {}
+    for i in range(0, len(product_ids), SQL_VARIABLE_CHUNK):
+        chunk = product_ids[i:i + SQL_VARIABLE_CHUNK]
+        cursor.execute(f'''
+            SELECT product_id, min_price, max_price, check_count, price_sum, ewma, last_price, last_change_at,
+                   window_ring
+            FROM product_price_stats WHERE product_id IN ({', '.join('?' * len(chunk))})
+        ''', chunk)
+        for row in cursor.fetchall():
+            all_stats[row[0]] = PriceStats.from_row(row[1:])
+
+    last_day: Dict[int, int] = {}
+    for product_id, price, checked_at in checks:
+        all_stats.setdefault(product_id, PriceStats()).add(price, checked_at)
+        last_day[product_id] = PriceStats.day_number(checked_at)
+
+    save_price_stats(cursor, [all_stats[product_id].to_row(product_id, day) for product_id, day in last_day.items()])
+
+
+def backfill_price_stats(cursor: sqlite3.Cursor) -> int:
+    """Build product_price_stats for every product from its price runs. Returns the number of products."""
+    today = datetime.utcnow().date().toordinal()
+    cursor.execute('''
+        SELECT product_id, price, first_seen, last_seen, check_count
+        FROM price_runs
+        WHERE product_id IN (SELECT id FROM tracked_products)  -- Not runs left behind by deleted products
+        ORDER BY product_id, last_seen, id
+    ''')
+    rows = cursor.fetchall()
+
+    all_stats: Dict[int, PriceStats] = {}
+    for product_id, price, first_seen, last_seen, check_count in rows:
+        stats = all_stats.setdefault(product_id, PriceStats())
+        stats.add(price, first_seen)
+        if check_count > 1:
+            stats.add(price, last_seen, check_count - 1)
+
+        # The run held this price on every day between its first and last check
+        first_day = max(PriceStats.day_number(first_seen) + 1, today - WINDOW_DAYS + 1)
+        for day in range(first_day, PriceStats.day_number(last_seen)):
+            stats.record_low(day, price)
+
+    save_price_stats(cursor, [stats.to_row(product_id, today) for product_id, stats in all_stats.items()])
+    return len(all_stats)
+
+
+def stats_to_dict(row: tuple, last_price: Optional[float]) -> Optional[Dict]:
+    """Shape the product_price_stats columns selected with a product for the API."""
+    min_price, max_price, check_count, price_sum, ewma, window_low, last_change_at = row
+    if not check_count:
+        return None
+    return {
+        'all_time_low': min_price,
+        'all_time_high': max_price,
+        'average': round(price_sum / check_count, 2),
+        'ewma': round(ewma, 2),
+        'window_low': window_low,
+        'window_days': WINDOW_DAYS,
+        'last_change_at': last_change_at,
+        'checks': check_count,
+        'at_window_low': last_price is not None and window_low is not None and last_price <= window_low,
+    }
@@ -0,0 +1,58 @@
+# backend/quarantine.py - Exponential deferral of products whose pages keep failing to scrape
+import sqlite3
+import time
+from typing import Dict, Iterable, Optional
+
+# Failure classes reported by the scraper (UltraStealthMultiPlatformScraper.failures)
+FAILURE_CLASSES = ('gone', 'blocked', 'http_error', 'network', 'no_price', 'unsupported', 'error')
+PERMANENT_FAILURES = ('gone', 'unsupported')  # Retrying within a run won't help
+
+QUARANTINE_AFTER = 3                 # Consecutive failures before a product's checks are deferred
+BASE_DEFERRAL = 12 * 60 * 60         # First deferral; doubles with every further failure
+MAX_DEFERRAL = 7 * 24 * 60 * 60      # Quarantined products are still tried at least weekly
+
+
+def deferral_seconds(consecutive_failures: int, failure_class: str) -> float:
+    """How long to wait before checking a product again; 0 means its normal cadence."""
+    threshold = 1 if failure_class in PERMANENT_FAILURES else QUARANTINE_AFTER
+    if consecutive_failures < threshold:
+        return 0.0
+    return min(MAX_DEFERRAL, BASE_DEFERRAL * 2 ** (consecutive_failures - threshold))
+
+
+def record_product_failure(cursor: sqlite3.Cursor, product_id: int, failure_class: str, failed_at: float) -> None:
+    """Count one more consecutive failure for a product and push its next check back accordingly."""
+    cursor.execute('SELECT consecutive_failures FROM product_failures WHERE product_id = ?', (product_id,))
+    row = cursor.fetchone()
+    consecutive = (row[0] if row else 0) + 1
+    defer = deferral_seconds(consecutive, failure_class)
+
+    # Skip products deleted while their failure was queued
+    cursor.execute('''
+        INSERT OR REPLACE INTO product_failures
+        (product_id, consecutive_failures, failure_class, last_failure_at, next_check_at)
+        SELECT ?, ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM tracked_products WHERE id = ?)
+    ''', (product_id, consecutive, failure_class, failed_at, failed_at + defer if defer else None, product_id))
+
+
+def clear_product_failures(cursor: sqlite3.Cursor, product_ids: Iterable[int]) -> None:
+    """A successful check puts products straight back on their normal cadence."""
+    cursor.executemany('DELETE FROM product_failures WHERE product_id = ?', [(pid,) for pid in product_ids])
+
+
+def is_deferred(next_check_at: Optional[float], now: Optional[float] = None) -> bool:
+    return next_check_at is not None and next_check_at > (now if now is not None else time.time())
+
+
+def failures_to_dict(row: tuple) -> Optional[Dict]:
+    """Shape the product_failures columns selected with a product for the API."""
+    consecutive_failures, failure_class, last_failure_at, next_check_at = row
+    if not consecutive_failures:
+        return None
+    return {
+        'consecutive_failures': consecutive_failures,
+        'failure_class': failure_class,
+        'last_failure_at': last_failure_at,
+        'next_check_at': next_check_at,
+        'quarantined': is_deferred(next_check_at),
+    }
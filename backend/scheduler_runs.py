@@ -0,0 +1,195 @@
+# backend/scheduler_runs.py - Per-run timings and the cadence of the scheduled jobs, kept in SQLite
+import time
+from typing import Dict, List, Optional, Tuple
+
+from database import DEFAULT_DB_PATH, get_connection
+from migrations import run_migrations
+
+RUN_STATUSES = ('running', 'ok', 'interrupted', 'failed', 'cancelled', 'skipped', 'abandoned')
+RETENTION_DAYS = 90
+
+
+class SchedulerRunLog:
+    """Records when each job run started and finished, what it processed and how it ended.
+
+    A run that takes longer than its job's interval is flagged as an overrun, and a
+    due time that was skipped because the previous run was still going gets its own
+    'skipped' row, so a job falling behind shows up in the table rather than only as
+    a growing gap between runs.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        run_migrations(db_path)
+
+    def start(self, job: str, holder: Optional[str] = None) -> int:
+        """Insert a 'running' row for a job run and return its id."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO scheduler_runs (job, holder, status, started_at)
+            VALUES (?, ?, 'running', ?)
+        ''', (job, holder, time.time()))
+        run_id = cursor.lastrowid
+        conn.commit()
+        conn.close()
+        return run_id
+
+    def finish(self, run_id: int, status: str, items: int = 0, failures: int = 0, overrun: bool = False) -> None:
+        """Close a run started with start()."""
+        conn = get_connection(self.db_path)
+        conn.execute('''
+            UPDATE scheduler_runs SET status = ?, finished_at = ?, items = ?, failures = ?, overrun = ?
+            WHERE id = ?
+        ''', (status, time.time(), items, failures, overrun, run_id))
+        conn.commit()
+        conn.close()
+
+    def skipped(self, job: str, holder: Optional[str] = None) -> None:
+        """Record a due time that was dropped because the previous run was still going."""
+        now = time.time()
+        conn = get_connection(self.db_path)
+        conn.execute('''
+            INSERT INTO scheduler_runs (job, holder, status, started_at, finished_at, overrun)
+            VALUES (?, ?, 'skipped', ?, ?, 1)
+        ''', (job, holder, now, now))
+        conn.commit()
+        conn.close()
+
+    def save_job_state(self, job: str, last_run: Optional[float], next_due: float) -> None:
+        """Store a job's next due time, and its last run start if given (Unix timestamps)."""
+        conn = get_connection(self.db_path)
+        conn.execute('''
+            INSERT INTO scheduler_jobs (name, last_run, next_due, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                last_run = COALESCE(excluded.last_run, scheduler_jobs.last_run),
+                next_due = excluded.next_due,
+                updated_at = excluded.updated_at
+        ''', (job, last_run, next_due, time.time()))
+        conn.commit()
+        conn.close()
+
+    def load_job_state(self) -> Dict[str, Tuple[Optional[float], Optional[float]]]:
+        """Get (last_run, next_due) for every job that has run before."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT name, last_run, next_due FROM scheduler_jobs')
+        rows = cursor.fetchall()
+        conn.close()
+        return {name: (last_run, next_due) for name, last_run, next_due in rows}
+
+    def save_user_latency(self, kind: str, users: Dict[int, Dict]) -> None:
+        """Store each user's latency report from a product or stock check run (fair_share.UserLatency.report)."""
+        now = time.time()
+        conn = get_connection(self.db_path)
+        conn.executemany('''
+            INSERT OR REPLACE INTO user_check_latency
+            (user_id, kind, run_at, checked, failed, deferred, avg_latency, p95_latency, max_latency)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (user_id, kind, now, user['checked'], user['failed'], user['deferred'],
+             user['avg_latency'], user['p95_latency'], user['max_latency'])
+            for user_id, user in users.items()
+        ])
+        conn.commit()
+        conn.close()
+
+    def user_latency(self, kind: Optional[str] = None) -> List[Dict]:
+        """Get every user's latest latency report, slowest p95 first."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT user_id, kind, run_at, checked, failed, deferred, avg_latency, p95_latency, max_latency
+            FROM user_check_latency {'WHERE kind = ?' if kind else ''}
+            ORDER BY p95_latency IS NULL, p95_latency DESC
+        ''', (kind,) if kind else ())
+        rows = cursor.fetchall()
+        conn.close()
+
+        columns = ('user_id', 'kind', 'run_at', 'checked', 'failed', 'deferred',
+                   'avg_latency', 'p95_latency', 'max_latency')
+        return [dict(zip(columns, row)) for row in rows]
+
+    def abandon_unfinished(self) -> int:
+        """Close runs left 'running' by a scheduler that died. Only call this while holding the lease."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE scheduler_runs SET status = 'abandoned', finished_at = ?
+            WHERE status = 'running'
+        ''', (time.time(),))
+        count = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return count
+
+    def prune(self, days: int = RETENTION_DAYS) -> int:
+        """Delete runs older than `days` days. Returns the number of rows removed."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM scheduler_runs WHERE started_at < ?', (time.time() - days * 86400,))
+        count = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return count
+
+    def recent(self, job: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Get the latest runs, newest first, for one job or all of them."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        columns = 'id, job, holder, status, started_at, finished_at, items, failures, overrun'
+        if job:
+            cursor.execute(f'''
+                SELECT {columns} FROM scheduler_runs WHERE job = ?
+                ORDER BY started_at DESC LIMIT ?
+            ''', (job, limit))
+        else:
+            cursor.execute(f'SELECT {columns} FROM scheduler_runs ORDER BY started_at DESC LIMIT ?', (limit,))
+        rows = cursor.fetchall()
+        conn.close()
+
+        now = time.time()
+        runs = []
+        for run_id, job_name, holder, status, started_at, finished_at, items, failures, overrun in rows:
+            duration = (finished_at if finished_at is not None else now) - started_at
+            runs.append({
+                'id': run_id,
+                'job': job_name,
+                'holder': holder,
+                'status': status,
+                'started_at': started_at,
+                'finished_at': finished_at,
+                'duration_seconds': round(duration, 3),
+                'items': items,
+                'failures': failures,
+                'items_per_minute': round(items / duration * 60, 2) if items and duration > 0 else None,
+                'overrun': bool(overrun),
+            })
+        return runs
+
+    def summary(self, runs: List[Dict]) -> Dict[str, Dict]:
+        """Per-job totals over a list of runs from recent()."""
+        jobs: Dict[str, Dict] = {}
+        for run in runs:
+            job = jobs.setdefault(run['job'], {
+                'runs': 0, 'skipped': 0, 'failed': 0, 'overruns': 0, 'items': 0, 'failures': 0,
+                'avg_duration_seconds': None, 'max_duration_seconds': None, 'last_status': run['status'],
+                '_durations': [],
+            })
+            if run['status'] == 'skipped':
+                job['skipped'] += 1
+                continue
+            job['runs'] += 1
+            job['failed'] += run['status'] in ('failed', 'abandoned')
+            job['overruns'] += run['overrun']
+            job['items'] += run['items']
+            job['failures'] += run['failures']
+            if run['status'] != 'running':
+                job['_durations'].append(run['duration_seconds'])
+
+        for job in jobs.values():
+            durations = job.pop('_durations')
+            if durations:
+                job['avg_duration_seconds'] = round(sum(durations) / len(durations), 3)
+                job['max_duration_seconds'] = max(durations)
+        return jobs
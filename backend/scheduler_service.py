@@ -7,11 +7,19 @@ import sys
 import threading
 from pathlib import Path
 from datetime import datetime, timedelta
-import schedule
 import logging
 
-from tracker import StorenvyPriceTracker
-from stock_tracker import StockPriceTracker
+from async_db import AsyncDatabase
+from async_scheduler import AsyncScheduler
+from config import Config
+from fair_share import FairShareScheduler, parse_weights
+from tracker import StorenvyPriceTracker, product_flight
+from stock_tracker import StockPriceTracker, ReplayQuoteProvider, WebSocketQuoteProvider, quote_flight
+from leader_lease import LeaderLease
+from scheduler_runs import SchedulerRunLog
+from market_calendar import MarketCalendar
+from notifier import alert_sender
+from write_buffer import close_all_buffers
 
 # Set up logging
 logging.basicConfig(
@@ -29,80 +37,226 @@ class PersistentSchedulerService:
         self.running = False
         self.product_tracker = StorenvyPriceTracker()
         self.stock_tracker = StockPriceTracker()
-        self.product_thread = None
-        self.stock_thread = None
-        
-        # Set up signal handlers for graceful shutdown
+        weights = parse_weights(Config.FAIR_SHARE_WEIGHTS)
+        self.product_tracker.fair_share = FairShareScheduler(
+            weights, Config.USER_PRODUCT_QUOTA, Config.PRODUCT_CHECK_CONCURRENCY, Config.PER_USER_CONCURRENCY)
+        self.stock_tracker.fair_share = FairShareScheduler(
+            weights, Config.USER_STOCK_QUOTA, Config.STOCK_CHECK_CONCURRENCY, Config.PER_USER_CONCURRENCY)
+        self.market_calendar = MarketCalendar()
+        self.last_stock_poll = {}  # exchange code -> datetime of last successful poll
+        self.quote_provider = None
+        # One event loop (in one thread) runs every job, so they share the DB executor and trackers
+        self.loop = None
+        self.loop_thread = None
+        self.main_task = None
+        self.scheduler = None
+        # Only the process holding this lease runs jobs (web workers + scheduler_service.py)
+        self.lease = LeaderLease('scheduler', self.product_tracker.db_path, ttl=Config.SCHEDULER_LEASE_SECONDS)
+        # Renewals get their own DB thread: a long rollup or flush queued on the shared one can't hold them past the TTL
+        self.lease_db = None
+        # Start/end, items and overruns of every job run, readable from any process
+        self.run_log = SchedulerRunLog(self.product_tracker.db_path)
+    
+    def install_signal_handlers(self):
+        """Stop gracefully on SIGINT/SIGTERM. Only for standalone runs: under gunicorn the server owns signals."""
         signal.signal(signal.SIGINT, self.signal_handler)
         signal.signal(signal.SIGTERM, self.signal_handler)
     
     def signal_handler(self, signum, frame):
-        """Handle shutdown signals gracefully."""
+        """Handle shutdown signals gracefully: scrapes in flight finish, the rest of the run resumes later."""
         logger.info(f"Received signal {signum}, shutting down gracefully...")
         self.stop()
         sys.exit(0)
     
-    def product_scheduler_worker(self):
-        """Worker for e-commerce and Roblox product price checking every 6 hours."""
-        # Schedule product checks every 6 hours
-        schedule.every(6).hours.do(self.check_products_job)
-        
-        # Also run immediately on startup
-        logger.info("🚀 Product scheduler started - will check every 6 hours")
-        self.check_products_job()
-        
-        while self.running:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
-        
-        logger.info("📦 Product scheduler stopped")
+    async def maintain_lease(self):
+        """Compete for, then keep renewing, the scheduler lease."""
+        while True:
+            await self.lease_db.run(self.lease.try_acquire)
+            await asyncio.sleep(self.lease.ttl / 3)
     
-    def stock_scheduler_worker(self):
-        """Worker for stock price checking every 5 minutes."""
-        # Schedule stock checks every 5 minutes
-        schedule.every(5).minutes.do(self.check_stocks_job)
-        
-        # Also run immediately on startup
-        logger.info("🚀 Stock scheduler started - will check every 5 minutes")
-        self.check_stocks_job()
+    async def wait_for_leadership(self):
+        """Wait until this process holds the scheduler lease."""
+        while not self.lease.is_leader():
+            await asyncio.sleep(1)
+    
+    def is_leader(self, job: str) -> bool:
+        """Check the lease whenever a job comes due, so a process that lost it doesn't scrape too."""
+        if not self.running:
+            return False  # Shutting down: don't start anything new
+        if self.lease.is_leader():
+            return True
+        logger.info(f"⏭️ Skipping {job}: another process holds the scheduler lease")
+        return False
+    
+    def create_quote_provider(self):
+        """Build the streaming quote provider from config, or None to poll."""
+        if Config.STOCK_STREAM_URL:
+            return WebSocketQuoteProvider(Config.STOCK_STREAM_URL, self.stock_tracker.get_active_symbols())
+        if Config.STOCK_REPLAY_FILE:
+            return ReplayQuoteProvider(Config.STOCK_REPLAY_FILE)
+        return None
+    
+    async def stream_stocks(self):
+        """Evaluate stock alerts on streamed ticks until the stream ends or fails."""
+        self.quote_provider = self.create_quote_provider()
+        if not self.quote_provider:
+            return
         
-        while self.running:
-            schedule.run_pending()
-            time.sleep(30)  # Check every 30 seconds for more precision
+        try:
+            logger.info("📡 Stock streaming mode enabled")
+            await self.stock_tracker.stream_stock_alerts(
+                self.quote_provider,
+                history_interval=Config.STOCK_HISTORY_INTERVAL_SECONDS,
+                should_stop=lambda: not self.running or not self.lease.is_leader()
+            )
+            logger.info("📡 Quote stream ended")
+        except Exception as e:
+            logger.error(f"❌ Quote stream failed: {e}")
+        finally:
+            self.quote_provider = None
         
-        logger.info("📈 Stock scheduler stopped")
+        if self.running:
+            logger.info("↩️ Falling back to 5-minute stock polling")
     
-    def check_products_job(self):
+    async def check_products_job(self):
         """Job to check all e-commerce and Roblox products."""
         try:
             logger.info("📦 Starting product price check...")
             
-            # Run async function in event loop
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self.product_tracker.check_all_products())
-            loop.close()
+            result = await self.product_tracker.check_all_products()
+            await self.product_tracker.db.run(self.run_log.save_user_latency, 'products', result['users'])
             
-            logger.info("✅ Product price check completed")
+            # An interrupted run was already reported by check_all_products, which leaves its checkpoint open
+            if not result.get('interrupted'):
+                logger.info(f"✅ Product price check completed: {result['items']} updated, {result['failures']} failed "
+                            f"(coalesced scrapes so far: {product_flight.stats()['coalesced']})")
+            return result
             
         except Exception as e:
             logger.error(f"❌ Error in product price check: {e}")
+            raise
     
-    def check_stocks_job(self):
-        """Job to check stock prices."""
+    async def check_stocks_job(self):
+        """Job to check stock prices for symbols whose exchange is open (or just closed)."""
+        if self.quote_provider:
+            return  # The quote stream is evaluating alerts on every tick
+        
         try:
+            now = datetime.now().astimezone()
+            symbols = await self.stock_tracker.db.run(self.stock_tracker.get_active_symbols)
+            
+            if not symbols:
+                logger.info("📈 No active stock alerts - skipping stock check")
+                return
+            
+            due = self.market_calendar.due_symbols(symbols, self.last_stock_poll, now)
+            
+            if not due:
+                next_opens = [
+                    self.market_calendar.next_open(exchange, now)
+                    for exchange in self.market_calendar.group_symbols_by_exchange(symbols)
+                ]
+                next_opens = [t for t in next_opens if t]
+                if next_opens:
+                    logger.info(f"🌙 Markets closed - skipping stock check until {min(next_opens).astimezone():%Y-%m-%d %H:%M %Z}")
+                else:
+                    logger.info("🌙 Markets closed - skipping stock check")
+                return
+            
+            for exchange, exchange_symbols in due.items():
+                if not self.market_calendar.is_open(exchange, now):
+                    logger.info(f"📸 Taking post-close snapshot for {exchange}: {', '.join(exchange_symbols)}")
+            
             logger.info("📈 Starting stock price check...")
             
-            # Run async function in event loop
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(self.stock_tracker.check_all_stock_alerts())
-            loop.close()
+            due_symbols = {symbol for exchange_symbols in due.values() for symbol in exchange_symbols}
+            result = await self.stock_tracker.check_all_stock_alerts(due_symbols)
+            await self.stock_tracker.db.run(self.run_log.save_user_latency, 'stocks', result['users'])
+            
+            for exchange in due:
+                self.last_stock_poll[exchange] = now
+            
+            # Fold the new ticks into the 5m / 1h / 1d bars
+            await self.stock_tracker.db.run(self.stock_tracker.history.rollup)
             
-            logger.info("✅ Stock price check completed")
+            logger.info(f"✅ Stock price check completed (coalesced quotes so far: {quote_flight.stats()['coalesced']})")
+            return result
             
         except Exception as e:
             logger.error(f"❌ Error in stock price check: {e}")
+            raise
+    
+    async def compact_stock_history_job(self):
+        """Job to roll up and delete raw stock history (and old scheduler runs) past their retention window."""
+        try:
+            result = await self.stock_tracker.db.run(self.stock_tracker.history.compact)
+            runs_deleted = await self.stock_tracker.db.run(self.run_log.prune)
+            logger.info(f"🗜️ Stock history compacted: {result['raw_rows_deleted']} raw rows, "
+                        f"{result['five_minute_bars_deleted']} 5-minute bars, {runs_deleted} scheduler runs removed")
+            return {'items': result['raw_rows_deleted'] + result['five_minute_bars_deleted'] + runs_deleted}
+        except Exception as e:
+            logger.error(f"❌ Error compacting stock history: {e}")
+            raise
+    
+    def build_scheduler(self):
+        """Register the timed jobs. Raises ValueError for an unknown overlap or catch-up policy in the config."""
+        scheduler = AsyncScheduler(self.run_log, holder=lambda: self.lease.holder_id, guard=self.is_leader,
+                                   catch_up=Config.SCHEDULER_CATCH_UP,
+                                   startup_jitter=Config.SCHEDULER_STARTUP_JITTER_SECONDS)
+        scheduler.every('products', 6 * 60 * 60, self.check_products_job, overlap=Config.PRODUCT_OVERLAP_POLICY,
+                        interrupted=self.product_tracker.has_interrupted_check_run)
+        scheduler.every('stocks', 5 * 60, self.check_stocks_job, overlap=Config.STOCK_OVERLAP_POLICY)
+        scheduler.daily('compact_stock_history', '03:00', self.compact_stock_history_job)
+        return scheduler
+    
+    async def run_scheduler(self):
+        """Main coroutine of the scheduler loop: lease, quote stream and timed jobs as tasks."""
+        self.lease_db = AsyncDatabase('lease')
+        lease_task = asyncio.create_task(self.maintain_lease(), name='scheduler-lease')
+        stream_task = None
+        
+        try:
+            # Idle until this process holds the scheduler lease
+            await self.wait_for_leadership()
+            
+            logger.info("🚀 Product scheduler started - will check every 6 hours")
+            logger.info("🚀 Stock scheduler started - will check every 5 minutes")
+            stream_task = asyncio.create_task(self.stream_stocks(), name='quote-stream')
+            await self.scheduler.run()
+        
+        except asyncio.CancelledError:
+            pass
+        
+        finally:
+            await self.scheduler.stop()
+            for task in (stream_task, lease_task):
+                if task:
+                    task.cancel()
+            await asyncio.gather(*[t for t in (stream_task, lease_task) if t], return_exceptions=True)
+            
+            # Hand the lease over to another process right away
+            await self.lease_db.run(self.lease.release)
+            self.lease_db.close()
+            logger.info("📦 Product scheduler stopped")
+            logger.info("📈 Stock scheduler stopped")
+    
+    async def drain(self, grace):
+        """Stop the checks taking new items and give the ones in flight up to `grace` seconds to finish."""
+        self.product_tracker.fair_share.drain()
+        self.stock_tracker.fair_share.drain()
+        if self.scheduler and not await self.scheduler.drain(grace):
+            logger.warning(f"⚠️ Checks still running after {grace}s - cancelling them (the product run resumes next start)")
+    
+    def run_loop(self):
+        """Body of the scheduler thread: run the main task to completion, then close the loop."""
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.main_task)
+        except asyncio.CancelledError:
+            pass  # Stopped before the main task got to run
+        finally:
+            self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+            self.loop.close()
     
     def start(self):
         """Start the persistent scheduler service."""
@@ -110,32 +264,27 @@ class PersistentSchedulerService:
             logger.warning("Scheduler service is already running")
             return
         
+        # Registered here rather than on the loop thread, so a misconfigured policy fails the start
+        self.scheduler = self.build_scheduler()
         self.running = True
         logger.info("🚀 Starting PriceTracker Scheduler Service...")
         logger.info("📦 E-commerce & Roblox Products: Every 6 hours")
-        logger.info("📈 Stocks: Every 5 minutes")
+        logger.info("📈 Stocks: Every 5 minutes while their exchange is open")
         
-        # Start product scheduler in separate thread
-        self.product_thread = threading.Thread(
-            target=self.product_scheduler_worker, 
+        # Run the scheduler loop in its own thread
+        self.loop = asyncio.new_event_loop()
+        self.main_task = self.loop.create_task(self.run_scheduler(), name='scheduler')
+        self.loop_thread = threading.Thread(
+            target=self.run_loop,
             daemon=False,
-            name="ProductScheduler"
+            name="SchedulerLoop"
         )
-        
-        # Start stock scheduler in separate thread
-        self.stock_thread = threading.Thread(
-            target=self.stock_scheduler_worker, 
-            daemon=False,
-            name="StockScheduler"
-        )
-        
-        self.product_thread.start()
-        self.stock_thread.start()
+        self.loop_thread.start()
         
         logger.info("✅ Scheduler service started successfully")
     
-    def stop(self):
-        """Stop the scheduler service."""
+    def stop(self, grace=Config.SHUTDOWN_GRACE_SECONDS):
+        """Stop the scheduler service, letting checks in flight finish for up to `grace` seconds."""
         if not self.running:
             logger.warning("Scheduler service is not running")
             return
@@ -143,15 +292,27 @@ class PersistentSchedulerService:
         logger.info("⏹️ Stopping scheduler service...")
         self.running = False
         
-        # Clear all scheduled jobs
-        schedule.clear()
+        if self.quote_provider:
+            self.quote_provider.close()
+        
+        if grace > 0 and self.loop_thread and self.loop_thread.is_alive():
+            try:
+                asyncio.run_coroutine_threadsafe(self.drain(grace), self.loop).result(grace + 5)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not drain running checks: {e}")
+        
+        # Cancel the main task; its finally block cancels the job tasks and waits for them
+        try:
+            self.loop.call_soon_threadsafe(self.main_task.cancel)
+        except RuntimeError:
+            pass  # Loop already finished
         
-        # Wait for threads to finish
-        if self.product_thread and self.product_thread.is_alive():
-            self.product_thread.join(timeout=5)
+        if self.loop_thread and self.loop_thread is not threading.current_thread():
+            self.loop_thread.join()
         
-        if self.stock_thread and self.stock_thread.is_alive():
-            self.stock_thread.join(timeout=5)
+        # Commit any scrape results still waiting in the write buffer
+        close_all_buffers()
+        alert_sender.close_sync()
         
         logger.info("✅ Scheduler service stopped")
     
@@ -163,14 +324,26 @@ class PersistentSchedulerService:
         """Get the status of the scheduler service."""
         return {
             'running': self.running,
-            'product_thread_alive': self.product_thread.is_alive() if self.product_thread else False,
-            'stock_thread_alive': self.stock_thread.is_alive() if self.stock_thread else False,
+            'loop_alive': self.loop_thread.is_alive() if self.loop_thread else False,
+            'leader': self.lease.is_leader(),
+            'lease': self.lease.holder(),
+            'jobs': self.scheduler.status() if self.scheduler else {},
             'products_interval': '6 hours',
-            'stocks_interval': '5 minutes'
+            'stocks_interval': '5 minutes (market hours)',
+            'coalesced_calls': {
+                'products': product_flight.stats(),
+                'stocks': quote_flight.stats()
+            },
+            'write_buffer': self.product_tracker.write_buffer.stats(),
+            'open_exchanges': [
+                code for code in self.market_calendar.exchanges
+                if self.market_calendar.is_open(code)
+            ]
         }
     
     def run_forever(self):
         """Run the scheduler service forever (for standalone operation)."""
+        self.install_signal_handlers()
         self.start()
         
         try:
@@ -180,7 +353,8 @@ class PersistentSchedulerService:
         except KeyboardInterrupt:
             logger.info("Received KeyboardInterrupt, shutting down...")
         finally:
-            self.stop()
+            if self.running:
+                self.stop()
 
 
 # Standalone script mode
@@ -190,7 +364,7 @@ if __name__ == "__main__":
     print("="*60)
     print("\n🚀 Starting persistent background service...")
     print("📦 E-commerce & Roblox Products: Auto-check every 6 hours")
-    print("📈 Stocks: Auto-check every 5 minutes")
+    print("📈 Stocks: Auto-check every 5 minutes during market hours")
     print("\n💡 This service runs independently of the web app")
     print("⏹️  Press Ctrl+C to stop the service")
     print("="*60 + "\n")
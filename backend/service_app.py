@@ -7,7 +7,11 @@ from pathlib import Path
 backend_dir = Path(__file__).parent
 sys.path.insert(0, str(backend_dir))
 
-from app import app
+# The launchd service is the only process in the default setup, so its web workers run the
+# scheduler (the scheduler lease keeps it to one active instance across the workers)
+os.environ.setdefault('START_SCHEDULER_FROM_WEB', 'True')
+
+from wsgi import serve
 
 if __name__ == '__main__':
     # Set up logging for launchd
@@ -19,11 +23,5 @@ if __name__ == '__main__':
     
     print("Starting Storenvy Price Tracker Service...")
     
-    # Run without debug mode for production
-    app.run(
-        debug=False,
-        port=5000,
-        host='0.0.0.0',
-        use_reloader=False  # Important: disable reloader for service
-    )
-
+    # Production WSGI server (workers/threads from WEB_WORKERS / WEB_THREADS)
+    serve()
@@ -0,0 +1,59 @@
+# backend/single_flight.py - Coalesce concurrent fetches of the same key
+import asyncio
+import concurrent.futures
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """Run at most one fetch per key at a time; concurrent callers share its result.
+
+    The web app and the scheduler threads each run their own event loop, so the
+    in-flight result is a thread-safe concurrent.futures.Future that any loop can
+    await. Nothing is cached: once the fetch finishes the next caller starts a new one.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._in_flight: Dict[Hashable, concurrent.futures.Future] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fetch: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Await fetch(*args, **kwargs), or the identical fetch already running for key."""
+        with self._lock:
+            self.calls += 1
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                future = concurrent.futures.Future()
+                self._in_flight[key] = future
+                leader = True
+
+        if not leader:
+            # shield() so a cancelled follower doesn't cancel the shared fetch
+            return await asyncio.shield(asyncio.wrap_future(future))
+
+        try:
+            result = await fetch(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is future:
+                    del self._in_flight[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Get the call counters (coalesced = calls that joined another caller's fetch)."""
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._in_flight),
+            }
@@ -0,0 +1,239 @@
+# backend/stock_history.py - OHLCV rollups and retention for stock_price_history
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database import DEFAULT_DB_PATH, get_connection
+from migrations import run_migrations
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'  # Same as SQLite CURRENT_TIMESTAMP (UTC)
+
+# (name, table, bucket size in seconds) from finest to coarsest
+RESOLUTIONS = [
+    ('5m', 'stock_bars_5m', 5 * 60),
+    ('1h', 'stock_bars_1h', 60 * 60),
+    ('1d', 'stock_bars_1d', 24 * 60 * 60),
+]
+
+# Nominal spacing of raw rows (streaming writes are throttled to about one a minute)
+RAW_STEP_SECONDS = 60
+
+
+def to_utc_string(value: datetime) -> str:
+    """Format a datetime like SQLite's CURRENT_TIMESTAMP (naive values are taken as UTC)."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def parse_utc_string(value: str) -> datetime:
+    return datetime.strptime(value[:19], TIMESTAMP_FORMAT)
+
+
+def bucket_start(value: datetime, bucket_seconds: int) -> datetime:
+    """Floor a naive UTC datetime to the start of its bucket."""
+    epoch = int(value.replace(tzinfo=timezone.utc).timestamp())
+    return datetime.fromtimestamp(epoch - epoch % bucket_seconds, tz=timezone.utc).replace(tzinfo=None)
+
+
+def aggregate_bars(points: Iterable[Tuple], bucket_seconds: int) -> List[Tuple]:
+    """Aggregate time-ordered (symbol, time, open, high, low, close, volume, samples) rows into bars."""
+    bars: Dict[Tuple[str, str], List] = {}
+
+    for symbol, at, open_, high, low, close, volume, samples in points:
+        key = (symbol, to_utc_string(bucket_start(parse_utc_string(at), bucket_seconds)))
+        bar = bars.get(key)
+        if bar is None:
+            bars[key] = [open_, high, low, close, volume, samples]
+        else:
+            bar[1] = max(bar[1], high)
+            bar[2] = min(bar[2], low)
+            bar[3] = close
+            if volume is not None:
+                bar[4] = volume if bar[4] is None else max(bar[4], volume)
+            bar[5] += samples
+
+    return [(symbol, start, *bar) for (symbol, start), bar in bars.items()]
+
+
+class StockHistoryStore:
+    """Rolls raw stock_price_history rows up into 5-minute, hourly and daily OHLCV bars.
+
+    5-minute bars are built from raw rows, hourly bars from 5-minute bars and daily
+    bars from hourly bars, so raw rows (and later old 5-minute bars) can be deleted
+    once they are rolled up. Volume is the largest cumulative session volume seen
+    in the bucket, since that is what the scraper reports.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, raw_retention_days: int = 7,
+                 five_minute_retention_days: int = 90):
+        self.db_path = db_path
+        self.raw_retention_days = raw_retention_days
+        self.five_minute_retention_days = five_minute_retention_days
+        self.init_history_tables()
+
+    def init_history_tables(self) -> None:
+        """Create the bar tables and the rollup watermark table (migration 003)."""
+        run_migrations(self.db_path)
+
+    def _get_watermark(self, cursor: sqlite3.Cursor) -> int:
+        cursor.execute("SELECT last_raw_id FROM stock_rollup_state WHERE name = 'raw'")
+        row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _rebuild_buckets(self, cursor: sqlite3.Cursor, source_sql: str, touched: Dict[str, datetime],
+                         table: str, bucket_seconds: int) -> Dict[str, datetime]:
+        """Recompute every bucket from the earliest touched one onwards, per symbol."""
+        next_touched: Dict[str, datetime] = {}
+
+        for symbol, since in touched.items():
+            start = bucket_start(since, bucket_seconds)
+            cursor.execute(source_sql, (symbol, to_utc_string(start)))
+            bars = aggregate_bars(cursor.fetchall(), bucket_seconds)
+            if not bars:
+                continue
+
+            cursor.executemany(f'''
+                INSERT OR REPLACE INTO {table}
+                    (symbol, bucket_start, open, high, low, close, volume, samples)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', bars)
+            next_touched[symbol] = start
+
+        return next_touched
+
+    def rollup(self) -> int:
+        """Roll new raw rows into 5m, 1h and 1d bars. Returns the number of raw rows consumed."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+
+        try:
+            watermark = self._get_watermark(cursor)
+            cursor.execute('''
+                SELECT symbol, MIN(checked_at), MAX(id), COUNT(*)
+                FROM stock_price_history
+                WHERE id > ?
+                GROUP BY symbol
+            ''', (watermark,))
+            new_rows = cursor.fetchall()
+            if not new_rows:
+                return 0
+
+            # Rows inserted after the MAX(id) read may land in these buckets too; that is
+            # harmless because buckets are always recomputed from their source rows
+            touched = {symbol: parse_utc_string(first_at) for symbol, first_at, _, _ in new_rows}
+            new_watermark = max(row[2] for row in new_rows)
+            consumed = sum(row[3] for row in new_rows)
+
+            # raw -> 5m
+            touched = self._rebuild_buckets(cursor, '''
+                SELECT symbol, checked_at, price, price, price, price, volume, 1
+                FROM stock_price_history
+                WHERE symbol = ? AND checked_at >= ?
+                ORDER BY checked_at, id
+            ''', touched, 'stock_bars_5m', RESOLUTIONS[0][2])
+
+            # 5m -> 1h -> 1d
+            for (_, source, _), (_, table, seconds) in zip(RESOLUTIONS, RESOLUTIONS[1:]):
+                touched = self._rebuild_buckets(cursor, f'''
+                    SELECT symbol, bucket_start, open, high, low, close, volume, samples
+                    FROM {source}
+                    WHERE symbol = ? AND bucket_start >= ?
+                    ORDER BY bucket_start
+                ''', touched, table, seconds)
+
+            cursor.execute('''
+                INSERT OR REPLACE INTO stock_rollup_state (name, last_raw_id) VALUES ('raw', ?)
+            ''', (new_watermark,))
+            conn.commit()
+            return consumed
+
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def compact(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Delete rolled-up raw rows and 5-minute bars older than their retention windows."""
+        self.rollup()
+        now = now or datetime.now(timezone.utc)
+
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+
+        watermark = self._get_watermark(cursor)
+        raw_cutoff = to_utc_string(now - timedelta(days=self.raw_retention_days))
+        cursor.execute('''
+            DELETE FROM stock_price_history
+            WHERE checked_at < ? AND id <= ?
+        ''', (raw_cutoff, watermark))
+        raw_deleted = cursor.rowcount
+
+        bar_cutoff = to_utc_string(now - timedelta(days=self.five_minute_retention_days))
+        cursor.execute('DELETE FROM stock_bars_5m WHERE bucket_start < ?', (bar_cutoff,))
+        bars_deleted = cursor.rowcount
+
+        conn.commit()
+        conn.close()
+
+        return {'raw_rows_deleted': raw_deleted, 'five_minute_bars_deleted': bars_deleted}
+
+    def pick_resolution(self, start: datetime, end: datetime, max_points: int,
+                        now: Optional[datetime] = None) -> str:
+        """Pick the finest resolution that fits max_points and is still retained for start."""
+        now = parse_utc_string(to_utc_string(now or datetime.now(timezone.utc)))
+        start = parse_utc_string(to_utc_string(start))
+        end = parse_utc_string(to_utc_string(end))
+        span = max((end - start).total_seconds(), 1)
+
+        retention = {
+            'raw': timedelta(days=self.raw_retention_days),
+            '5m': timedelta(days=self.five_minute_retention_days),
+        }
+        candidates = [('raw', RAW_STEP_SECONDS)] + [(name, seconds) for name, _, seconds in RESOLUTIONS]
+
+        for name, seconds in candidates:
+            if name in retention and start < now - retention[name]:
+                continue
+            if span / seconds <= max_points:
+                return name
+        return '1d'
+
+    def get_bars(self, symbol: str, start: datetime, end: datetime, max_points: int = 500,
+                 resolution: Optional[str] = None) -> Dict:
+        """Get OHLCV bars for symbol between start and end at an automatically chosen resolution."""
+        symbol = symbol.upper().strip()
+        resolution = resolution or self.pick_resolution(start, end, max_points)
+        params = (symbol, to_utc_string(start), to_utc_string(end))
+
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+
+        if resolution == 'raw':
+            cursor.execute('''
+                SELECT checked_at, price, price, price, price, volume
+                FROM stock_price_history
+                WHERE symbol = ? AND checked_at >= ? AND checked_at <= ?
+                ORDER BY checked_at
+            ''', params)
+        else:
+            table = {name: table for name, table, _ in RESOLUTIONS}[resolution]
+            cursor.execute(f'''
+                SELECT bucket_start, open, high, low, close, volume
+                FROM {table}
+                WHERE symbol = ? AND bucket_start >= ? AND bucket_start <= ?
+                ORDER BY bucket_start
+            ''', params)
+
+        bars = [{
+            'time': row[0],
+            'open': row[1],
+            'high': row[2],
+            'low': row[3],
+            'close': row[4],
+            'volume': row[5]
+        } for row in cursor.fetchall()]
+
+        conn.close()
+        return {'symbol': symbol, 'resolution': resolution, 'bars': bars}
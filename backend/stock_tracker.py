@@ -1,74 +1,258 @@
 # backend/stock_tracker.py - FIXED VERSION WITH USER SUPPORT
 import asyncio
+import bisect
 import json
 import re
-import smtplib
 import sqlite3
+import threading
 import time
 from datetime import datetime, timedelta
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 from playwright.async_api import async_playwright
 
+from async_db import database_thread
+from database import get_connection
+from fair_share import FairShareScheduler, UserLatency
+from indicators import INDICATOR_ALERT_TYPES, IndicatorStore
+from migrations import run_migrations
+from notifier import alert_sender
+from single_flight import SingleFlight
+from stock_history import StockHistoryStore
+from write_buffer import get_write_buffer
+
+# Shared by every StockPriceTracker in the process (web app and scheduler threads)
+quote_flight = SingleFlight('stock_quotes')
+
+
+class StockAlertIndex:
+    """In-memory index of untriggered alert thresholds, kept sorted per (symbol, alert_type).
+    
+    price_above / percent_up / percent_down fire when a value rises to a threshold,
+    price_below fires when the price falls to it. Each new quote bisects the range
+    between the previous and the current value, so only newly crossed alerts are
+    touched. Alerts added since the last quote wait in a pending list and are
+    evaluated once directly, because they may already be satisfied on the far side
+    of the previous value.
+    """
+    
+    ALERT_TYPES = ('price_above', 'price_below', 'percent_up', 'percent_down')
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thresholds: Dict[Tuple[str, str], List[float]] = {}
+        self._alert_ids: Dict[Tuple[str, str], List[int]] = {}
+        self._pending: Dict[Tuple[str, str], Dict[int, float]] = {}
+        self._locations: Dict[int, Tuple[str, str, float]] = {}
+        self._last_quote: Dict[str, Tuple[float, float]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._locations)
+    
+    def clear(self) -> None:
+        """Drop every indexed alert and the remembered quotes."""
+        with self._lock:
+            self._thresholds.clear()
+            self._alert_ids.clear()
+            self._pending.clear()
+            self._locations.clear()
+            self._last_quote.clear()
+    
+    def add(self, alert_id: int, symbol: str, alert_type: str, threshold: float) -> None:
+        """Add (or replace) an untriggered alert."""
+        if alert_type not in self.ALERT_TYPES:
+            return
+        with self._lock:
+            self._remove_locked(alert_id)
+            key = (symbol, alert_type)
+            self._pending.setdefault(key, {})[alert_id] = threshold
+            self._locations[alert_id] = (symbol, alert_type, threshold)
+    
+    def remove(self, alert_id: int) -> None:
+        """Remove an alert if it is indexed."""
+        with self._lock:
+            self._remove_locked(alert_id)
+    
+    def _remove_locked(self, alert_id: int) -> None:
+        location = self._locations.pop(alert_id, None)
+        if location is None:
+            return
+        symbol, alert_type, threshold = location
+        key = (symbol, alert_type)
+        
+        pending = self._pending.get(key)
+        if pending and alert_id in pending:
+            del pending[alert_id]
+            return
+        
+        thresholds = self._thresholds.get(key, [])
+        alert_ids = self._alert_ids.get(key, [])
+        i = bisect.bisect_left(thresholds, threshold)
+        while i < len(thresholds) and thresholds[i] == threshold:
+            if alert_ids[i] == alert_id:
+                del thresholds[i]
+                del alert_ids[i]
+                return
+            i += 1
+    
+    @staticmethod
+    def _value_for(alert_type: str, price: float, change_percent: float) -> float:
+        if alert_type in ('price_above', 'price_below'):
+            return price
+        if alert_type == 'percent_up':
+            return change_percent
+        return -change_percent  # percent_down: change_percent <= -threshold
+    
+    def crossed(self, symbol: str, price: float, change_percent: float) -> List[int]:
+        """Find and remove every alert on symbol that this quote newly triggers."""
+        triggered: List[int] = []
+        
+        with self._lock:
+            previous = self._last_quote.get(symbol)
+            
+            for alert_type in self.ALERT_TYPES:
+                key = (symbol, alert_type)
+                value = self._value_for(alert_type, price, change_percent)
+                rising = alert_type != 'price_below'
+                thresholds = self._thresholds.setdefault(key, [])
+                alert_ids = self._alert_ids.setdefault(key, [])
+                
+                # Indexed alerts: everything between the previous and current value
+                if rising:
+                    hi = bisect.bisect_right(thresholds, value)
+                    lo = 0
+                    if previous is not None:
+                        prev_value = self._value_for(alert_type, *previous)
+                        lo = min(bisect.bisect_right(thresholds, prev_value), hi)
+                else:
+                    lo = bisect.bisect_left(thresholds, value)
+                    hi = len(thresholds)
+                    if previous is not None:
+                        prev_value = self._value_for(alert_type, *previous)
+                        hi = max(bisect.bisect_left(thresholds, prev_value), lo)
+                
+                if lo < hi:
+                    triggered.extend(alert_ids[lo:hi])
+                    del thresholds[lo:hi]
+                    del alert_ids[lo:hi]
+                
+                # Pending alerts: evaluate once, then move into the sorted lists
+                pending = self._pending.pop(key, None)
+                if pending:
+                    for alert_id, threshold in pending.items():
+                        if (value >= threshold) if rising else (value <= threshold):
+                            triggered.append(alert_id)
+                        else:
+                            i = bisect.bisect_right(thresholds, threshold)
+                            thresholds.insert(i, threshold)
+                            alert_ids.insert(i, alert_id)
+            
+            for alert_id in triggered:
+                self._locations.pop(alert_id, None)
+            self._last_quote[symbol] = (price, change_percent)
+        
+        return triggered
+
+
+class ReplayQuoteProvider:
+    """Quote stream that replays ticks from a JSON-lines file.
+    
+    Each line is {"symbol": "AAPL", "price": 190.1, "change_percent": 0.4,
+    "volume": 1200, "timestamp": 1700000000.0}; only symbol and price are required.
+    With speed > 0 the gaps between timestamps are replayed (divided by speed),
+    with speed == 0 ticks are yielded as fast as they can be consumed.
+    """
+    
+    def __init__(self, replay_path: str, speed: float = 0.0):
+        self.replay_path = replay_path
+        self.speed = speed
+        self.closed = False
+    
+    def close(self) -> None:
+        self.closed = True
+    
+    async def __aiter__(self):
+        previous_timestamp = None
+        
+        with open(self.replay_path, 'r') as f:
+            for line in f:
+                if self.closed:
+                    return
+                line = line.strip()
+                if not line:
+                    continue
+                
+                tick = json.loads(line)
+                timestamp = tick.get('timestamp')
+                if self.speed > 0 and timestamp is not None and previous_timestamp is not None:
+                    await asyncio.sleep(max(0.0, (timestamp - previous_timestamp) / self.speed))
+                else:
+                    await asyncio.sleep(0)
+                previous_timestamp = timestamp
+                
+                yield tick
+
+
+class WebSocketQuoteProvider:
+    """Quote stream read from a WebSocket feed (requires the optional websockets package).
+    
+    On connect it sends {"subscribe": [symbols]}, then expects one JSON tick per
+    message in the same shape as ReplayQuoteProvider lines.
+    """
+    
+    def __init__(self, url: str, symbols: List[str], recv_timeout: float = 1.0):
+        self.url = url
+        self.symbols = symbols
+        self.recv_timeout = recv_timeout
+        self.closed = False
+    
+    def close(self) -> None:
+        self.closed = True
+    
+    async def __aiter__(self):
+        try:
+            import websockets
+        except ImportError:
+            raise RuntimeError("Streaming quotes over WebSocket need the websockets package: pip install websockets")
+        
+        async with websockets.connect(self.url) as ws:
+            await ws.send(json.dumps({'subscribe': self.symbols}))
+            
+            while not self.closed:
+                try:
+                    message = await asyncio.wait_for(ws.recv(), timeout=self.recv_timeout)
+                except asyncio.TimeoutError:
+                    continue  # Wake up periodically so close() is noticed
+                
+                tick = json.loads(message)
+                if 'symbol' in tick and 'price' in tick:
+                    yield tick
+
 
 class StockPriceTracker:
     def __init__(self, db_path: str = "storenvy_tracker.db"):
         self.db_path = db_path
         self.init_stock_tables()
+        self.write_buffer = get_write_buffer(db_path)
+        self.db = database_thread
+        # Round robin across users with no limits; the scheduler service applies the configured ones
+        self.fair_share = FairShareScheduler()
+        self.history = StockHistoryStore(db_path)
+        self.indicators = IndicatorStore(db_path)
+        self.alert_index = StockAlertIndex()
+        self._alert_index_signature = None
+        self.refresh_alert_index()
         
     def init_stock_tables(self) -> None:
         """Initialize SQLite database tables for stock tracking."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Stock alerts table with user_id
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS stock_alerts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                symbol TEXT NOT NULL,
-                company_name TEXT,
-                alert_type TEXT NOT NULL,
-                threshold REAL NOT NULL,
-                current_price REAL,
-                last_checked TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                is_triggered BOOLEAN DEFAULT 0,
-                UNIQUE(user_id, symbol, alert_type, threshold)
-            )
-        ''')
-        
-        # Check if user_id column exists in existing table
-        cursor.execute("PRAGMA table_info(stock_alerts)")
-        columns = [column[1] for column in cursor.fetchall()]
-        
-        if 'user_id' not in columns:
-            # Add user_id column to existing table
-            cursor.execute('ALTER TABLE stock_alerts ADD COLUMN user_id INTEGER DEFAULT 1')
-            print("Added user_id column to stock_alerts table")
-        
-        # Stock price history table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS stock_price_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                symbol TEXT NOT NULL,
-                price REAL NOT NULL,
-                volume INTEGER,
-                change_percent REAL,
-                market_cap TEXT,
-                checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        run_migrations(self.db_path)
     
     def add_stock_alert(self, symbol: str, alert_type: str, threshold: float, user_id: int) -> None:
         """Add a stock alert to track for a specific user."""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_connection(self.db_path)
         cursor = conn.cursor()
         
         # Convert symbol to uppercase
@@ -80,6 +264,7 @@ class StockPriceTracker:
                 VALUES (?, ?, ?, ?)
             ''', (user_id, symbol, alert_type, threshold))
             conn.commit()
+            self.alert_index.add(cursor.lastrowid, symbol, alert_type, threshold)
         except sqlite3.IntegrityError:
             # Update existing alert
             cursor.execute('''
@@ -88,12 +273,21 @@ class StockPriceTracker:
                 WHERE user_id = ? AND symbol = ?
             ''', (alert_type, threshold, user_id, symbol))
             conn.commit()
+            
+            # Re-index every alert the update touched (they are untriggered again)
+            cursor.execute('''
+                SELECT id, symbol, alert_type, threshold FROM stock_alerts
+                WHERE user_id = ? AND symbol = ?
+            ''', (user_id, symbol))
+            for row in cursor.fetchall():
+                self.alert_index.add(*row)
         
+        self._alert_index_signature = self._alert_table_signature(cursor)
         conn.close()
     
     def delete_stock_alert(self, alert_id: int, user_id: int) -> None:
         """Delete a stock alert for a specific user."""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_connection(self.db_path)
         cursor = conn.cursor()
         
         # Delete price history first
@@ -107,13 +301,48 @@ class StockPriceTracker:
         
         # Delete alert
         cursor.execute('DELETE FROM stock_alerts WHERE id = ? AND user_id = ?', (alert_id, user_id))
+        if cursor.rowcount:
+            self.alert_index.remove(alert_id)
         
         conn.commit()
+        self._alert_index_signature = self._alert_table_signature(cursor)
+        conn.close()
+    
+    def _alert_table_signature(self, cursor: sqlite3.Cursor) -> Tuple:
+        """Cheap fingerprint of stock_alerts used to spot writes from other processes."""
+        cursor.execute('''
+            SELECT COUNT(*), COALESCE(MAX(id), 0), COALESCE(SUM(is_triggered), 0), TOTAL(threshold)
+            FROM stock_alerts
+        ''')
+        return cursor.fetchone()
+    
+    def _sync_alert_index_signature(self) -> None:
+        """Record the current table fingerprint after writes this tracker made itself."""
+        conn = get_connection(self.db_path)
+        self._alert_index_signature = self._alert_table_signature(conn.cursor())
+        conn.close()
+    
+    def refresh_alert_index(self, force: bool = False) -> None:
+        """Rebuild the threshold index if stock_alerts changed outside this tracker."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        
+        signature = self._alert_table_signature(cursor)
+        if force or signature != self._alert_index_signature:
+            cursor.execute('''
+                SELECT id, symbol, alert_type, threshold FROM stock_alerts
+                WHERE is_triggered = 0
+            ''')
+            self.alert_index.clear()
+            for row in cursor.fetchall():
+                self.alert_index.add(*row)
+            self._alert_index_signature = signature
+        
         conn.close()
     
     def get_stock_alerts(self, user_id: int) -> List[Dict[str, any]]:
         """Get all stock alerts for a specific user."""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_connection(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -136,6 +365,8 @@ class StockPriceTracker:
                     status = 'triggered' if row[7] else 'monitoring'
                 elif row[3] == 'percent_down' and row[5] > 0:
                     status = 'triggered' if row[7] else 'monitoring'
+                elif row[3] in INDICATOR_ALERT_TYPES:
+                    status = 'triggered' if row[7] else 'monitoring'
             
             alerts.append({
                 'id': row[0],
@@ -154,7 +385,7 @@ class StockPriceTracker:
 
     def get_all_alerts_for_checking(self) -> List[Dict[str, any]]:
         """Get all stock alerts from all users for checking."""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_connection(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -187,25 +418,8 @@ class StockPriceTracker:
         return alerts
     
     def update_stock_info(self, symbol: str, company_name: str, price: float, volume: int = None, change_percent: float = None) -> None:
-        """Update stock information after scraping."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Update current price in alerts table
-        cursor.execute('''
-            UPDATE stock_alerts
-            SET company_name = ?, current_price = ?, last_checked = ?
-            WHERE symbol = ?
-        ''', (company_name, price, datetime.now(), symbol))
-        
-        # Add to price history
-        cursor.execute('''
-            INSERT INTO stock_price_history (symbol, price, volume, change_percent)
-            VALUES (?, ?, ?, ?)
-        ''', (symbol, price, volume, change_percent))
-        
-        conn.commit()
-        conn.close()
+        """Queue stock information after scraping (committed in batches by the write buffer)."""
+        self.write_buffer.add_stock_update(symbol, company_name, price, volume, change_percent)
     
     async def scrape_yahoo_finance(self, symbol: str) -> Optional[Tuple[str, float, int, float]]:
         """Improved Yahoo Finance scraper with better reliability."""
@@ -330,6 +544,10 @@ class StockPriceTracker:
                 await browser.close()
 
     async def get_stock_data(self, symbol: str) -> Optional[Tuple[str, float, int, float]]:
+        """Get stock data, sharing one in-flight fetch between concurrent callers for a symbol."""
+        return await quote_flight.do(symbol.upper().strip(), self.fetch_stock_data, symbol)
+
+    async def fetch_stock_data(self, symbol: str) -> Optional[Tuple[str, float, int, float]]:
         """Get stock data with fallback sources."""
         print(f"Attempting to get data for {symbol}...")
         data = await self.scrape_yahoo_finance(symbol)
@@ -356,26 +574,24 @@ class StockPriceTracker:
         
         return False
 
-    def send_stock_alert_email(self, alert: Dict, current_price: float, change_percent: float) -> None:
-        """Send email alert for stock price trigger."""
-        if not alert.get('smtp_password'):
-            return
+    def build_stock_alert_email(self, alert: Dict, current_price: float, change_percent: float) -> MIMEMultipart:
+        """Build the email for a stock price trigger."""
+        msg = MIMEMultipart()
+        msg['From'] = alert['user_email']
+        msg['To'] = alert['user_email']
+        msg['Subject'] = f"🚨 Stock Alert: {alert['symbol']} - {alert['alert_type']}"
+        
+        # Create alert type description
+        alert_descriptions = {
+            'price_above': f"Price above ${alert['threshold']:.2f}",
+            'price_below': f"Price below ${alert['threshold']:.2f}",
+            'percent_up': f"Up {alert['threshold']}% or more",
+            'percent_down': f"Down {alert['threshold']}% or more"
+        }
+        for indicator_type, template in INDICATOR_ALERT_TYPES.items():
+            alert_descriptions[indicator_type] = template.format(n=int(alert['threshold']))
         
-        try:
-            msg = MIMEMultipart()
-            msg['From'] = alert['user_email']
-            msg['To'] = alert['user_email']
-            msg['Subject'] = f"🚨 Stock Alert: {alert['symbol']} - {alert['alert_type']}"
-            
-            # Create alert type description
-            alert_descriptions = {
-                'price_above': f"Price above ${alert['threshold']:.2f}",
-                'price_below': f"Price below ${alert['threshold']:.2f}",
-                'percent_up': f"Up {alert['threshold']}% or more",
-                'percent_down': f"Down {alert['threshold']}% or more"
-            }
-            
-            body = f"""
+        body = f"""
 Hello {alert['user_name']}! 🚨
 
 Stock Alert Triggered!
@@ -395,24 +611,26 @@ Happy trading! 📈
 
 Best regards,
 PriceTracker
-            """
-            
-            msg.attach(MIMEText(body, 'plain'))
-            
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(alert['user_email'], alert['smtp_password'])
-            server.send_message(msg)
-            server.quit()
-            
-            print(f"📧 Alert email sent to {alert['user_name']} for {alert['symbol']}")
-            
-        except Exception as e:
-            print(f"Failed to send stock alert email: {str(e)}")
+        """
+        
+        msg.attach(MIMEText(body, 'plain'))
+        return msg
+
+    async def send_stock_alert_email(self, alert: Dict, current_price: float, change_percent: float) -> None:
+        """Send email alert for stock price trigger, off the event loop over the account's reused SMTP connection.
+
+        Raises if the email couldn't be sent, so the alert isn't marked as triggered.
+        """
+        if not alert.get('smtp_password'):
+            return
+        
+        msg = self.build_stock_alert_email(alert, current_price, change_percent)
+        await alert_sender.send(msg, alert['user_email'], alert['smtp_password'])
+        print(f"📧 Alert email sent to {alert['user_name']} for {alert['symbol']}")
 
     def mark_alert_triggered(self, alert_id: int) -> None:
         """Mark an alert as triggered to avoid spam."""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_connection(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -423,68 +641,254 @@ PriceTracker
         
         conn.commit()
         conn.close()
+        self.alert_index.remove(alert_id)
 
-    async def check_all_stock_alerts(self) -> None:
-        """Check all stock alerts for all users."""
-        alerts = self.get_all_alerts_for_checking()
+    def get_active_symbols(self) -> List[str]:
+        """Get the distinct symbols that still have untriggered alerts."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT DISTINCT symbol FROM stock_alerts WHERE is_triggered = 0')
+        symbols = [row[0] for row in cursor.fetchall()]
+        
+        conn.close()
+        return symbols
+
+    def indicator_triggers(self, symbol: str, alerts: List[Dict], current_price: float,
+                           persist: bool = True) -> List[Dict]:
+        """Update the symbol's indicators with a new price and return the indicator alerts it newly meets."""
+        indicator_alerts = [alert for alert in alerts if alert['alert_type'] in INDICATOR_ALERT_TYPES]
+        if not indicator_alerts:
+            return []
+        
+        periods = {int(alert['threshold']) for alert in indicator_alerts}
+        signals = self.indicators.update(symbol, current_price, periods, persist=persist)
+        
+        triggered = []
+        for alert in indicator_alerts:
+            if not alert['is_triggered'] and self.indicators.check_alert(alert, signals):
+                alert['is_triggered'] = 1
+                triggered.append(alert)
+        return triggered
+
+    async def handle_triggered_alert(self, alert: Dict, current_price: float, change_percent: float) -> bool:
+        """Notify the user about a triggered alert and mark it so it doesn't fire again.
+
+        The email and the database write both run off the event loop. If either fails
+        the alert goes back into the threshold index (crossed() already took it out),
+        so the next quote re-checks it. Returns whether the alert was handled.
+        """
+        print(f"🚨 ALERT TRIGGERED: {alert['symbol']} - {alert['alert_type']} for {alert['user_name']}")
+        
+        try:
+            if alert.get('smtp_password'):
+                await self.send_stock_alert_email(alert, current_price, change_percent)
+            
+            await self.db.run(self.mark_alert_triggered, alert['id'])
+            return True
+        
+        except Exception as e:
+            print(f"❌ Failed to handle alert {alert['id']} for {alert['symbol']}, will retry on the next quote: {e}")
+            alert['is_triggered'] = 0
+            self.alert_index.add(alert['id'], alert['symbol'], alert['alert_type'], alert['threshold'])
+            return False
+
+    async def check_all_stock_alerts(self, symbols: Optional[Set[str]] = None) -> Dict[str, any]:
+        """Check all stock alerts for all users, fetching each symbol once per cycle.
+        
+        If symbols is given, only alerts on those symbols are checked (used by the
+        scheduler to skip symbols whose exchange is closed). Symbols are fetched with
+        users taking turns (see fair_share.FairShareScheduler); a symbol several users
+        watch is fetched once for all of them. Returns how many symbols were quoted
+        ('items') and how many quotes failed ('failures'), plus per-user latency ('users').
+        """
+        due_at = time.time()
+        
+        # Pick up alerts added or deleted by another process (e.g. the web app)
+        await self.db.run(self.refresh_alert_index)
+        
+        alerts = await self.db.run(self.get_all_alerts_for_checking)
+        if symbols is not None:
+            alerts = [alert for alert in alerts if alert['symbol'] in symbols]
         
         if not alerts:
             print("No stock alerts to check")
-            return
-        
-        print(f"🔄 Checking {len(alerts)} stock alerts...")
+            return {'items': 0, 'failures': 0, 'users': {}}
         
+        # Group pending alerts by symbol so each quote is scraped only once
+        alerts_by_symbol: Dict[str, List[Dict]] = {}
         for alert in alerts:
             # Skip already triggered alerts (to avoid spam)
             if alert['is_triggered']:
                 continue
-                
-            symbol = alert['symbol']
-            print(f"📊 Checking {symbol} for user {alert['user_name']}...")
+            alerts_by_symbol.setdefault(alert['symbol'], []).append(alert)
+        
+        if not alerts_by_symbol:
+            print("All stock alerts already triggered - nothing to check")
+            return {'items': 0, 'failures': 0, 'users': {}}
+        
+        def owners(symbol: str) -> Set[int]:
+            return {alert['user_id'] for alert in alerts_by_symbol[symbol]}
+        
+        ordered_symbols = list(alerts_by_symbol)
+        if self.fair_share.quota:
+            # Least recently checked first, so symbols deferred by the quota go first next cycle
+            ordered_symbols.sort(key=lambda symbol: min(alert['last_checked'] or '' for alert in alerts_by_symbol[symbol]))
+        plan, deferred = self.fair_share.plan(ordered_symbols, key=lambda symbol: symbol, owners=owners)
+        
+        latency = UserLatency(due_at)
+        for symbol in deferred:
+            for user_id in owners(symbol):
+                latency.deferred[user_id] += 1
+        
+        print(f"🔄 Checking {len(alerts)} stock alerts across {len(plan)} symbols"
+              f"{f' ({len(deferred)} deferred by the per-user quota)' if deferred else ''}...")
+        
+        # Each quote bisects the threshold index as it arrives, so alerts fire without waiting for the cycle
+        quotes: Dict[str, Tuple[float, float]] = {}
+        
+        async def check(symbol: str) -> bool:
+            symbol_alerts = alerts_by_symbol[symbol]
+            print(f"📊 Checking {symbol} for {len(symbol_alerts)} alert(s)...")
             
             stock_data = await self.get_stock_data(symbol)
             
-            if stock_data:
+            if not stock_data:
+                print(f"❌ Failed to get data for {symbol}")
+                return False
+            
+            try:
                 company_name, current_price, volume, change_percent = stock_data
+                quotes[symbol] = (current_price, change_percent)
                 
-                # Update database with current info
+                # Update database with current info once per symbol
                 self.update_stock_info(symbol, company_name, current_price, volume, change_percent)
                 
-                # Check if alert conditions are met
-                if self.check_alert_conditions(alert, current_price, change_percent):
-                    print(f"🚨 ALERT TRIGGERED: {symbol} - {alert['alert_type']} for {alert['user_name']}")
-                    
-                    # Send notification if user has SMTP configured
-                    if alert.get('smtp_password'):
-                        self.send_stock_alert_email(alert, current_price, change_percent)
-                    
-                    # Mark as triggered to avoid repeated alerts
-                    self.mark_alert_triggered(alert['id'])
-                else:
+                # Indicator alerts (SMA/EMA crosses, N-day highs/lows, Bollinger) use per-symbol state
+                for alert in await self.db.run(self.indicator_triggers, symbol, symbol_alerts, current_price):
+                    await self.handle_triggered_alert(alert, current_price, change_percent)
+                
+                # Bisect the threshold index for alerts this quote newly crosses
+                triggered_ids = set(self.alert_index.crossed(symbol, current_price, change_percent))
+                
+                for alert in symbol_alerts:
+                    if alert['id'] in triggered_ids:
+                        await self.handle_triggered_alert(alert, current_price, change_percent)
+                
+                if not triggered_ids:
                     print(f"✅ {symbol}: ${current_price:.2f} ({change_percent:+.2f}%) - No trigger")
-            else:
-                print(f"❌ Failed to get data for {symbol}")
+                return True
+            
+            except Exception as e:
+                print(f"❌ Error checking {symbol}: {e}")
+                return False
+        
+        async def be_nice() -> None:
+            await asyncio.sleep(3)  # Be nice to the servers
+        
+        await self.fair_share.run(plan, check, owners=owners, latency=latency, pause=be_nice)
+        
+        await self.db.run(self.write_buffer.flush)
+        await alert_sender.close()  # Log out of the SMTP connections this cycle's alerts opened
+        
+        # Our own triggered flags changed the table; don't treat that as an outside write
+        await self.db.run(self._sync_alert_index_signature)
+        return {'items': len(quotes), 'failures': len(plan) - len(quotes), 'users': latency.report()}
+
+    async def stream_stock_alerts(self, provider, history_interval: float = 60.0,
+                                  refresh_interval: float = 30.0,
+                                  should_stop: Optional[Callable[[], bool]] = None) -> int:
+        """Evaluate alerts on every tick pushed by a quote provider.
+        
+        Alerts are checked against every tick through the threshold index, while
+        update_stock_info (and so stock_price_history) is written at most once per
+        history_interval seconds per symbol. The alert set is re-read every
+        refresh_interval seconds to pick up changes from the web app. Returns the
+        number of ticks processed when the provider ends or should_stop() is true.
+        """
+        alerts_by_id: Dict[int, Dict] = {}
+        indicator_alerts: Dict[str, List[Dict]] = {}
+        company_names: Dict[str, str] = {}
+        last_written: Dict[str, float] = {}
+        last_refresh = None
+        ticks = 0
+        
+        print("📡 Streaming stock quotes...")
+        
+        async for tick in provider:
+            now = time.monotonic()
+            if last_refresh is None or now - last_refresh >= refresh_interval:
+                await self.db.run(self.refresh_alert_index)
+                await self.db.run(self.write_buffer.flush)
+                await self.db.run(self.history.rollup)
+                alerts_by_id = {alert['id']: alert for alert in await self.db.run(self.get_all_alerts_for_checking)}
+                company_names = {alert['symbol']: alert['company_name'] for alert in alerts_by_id.values()}
+                indicator_alerts = {}
+                for alert in alerts_by_id.values():
+                    if alert['alert_type'] in INDICATOR_ALERT_TYPES and not alert['is_triggered']:
+                        indicator_alerts.setdefault(alert['symbol'], []).append(alert)
+                last_refresh = now
+            
+            symbol = str(tick['symbol']).upper()
+            price = float(tick['price'])
+            change_percent = float(tick.get('change_percent') or 0.0)
+            ticks += 1
             
-            # Be nice to the servers
-            await asyncio.sleep(3)
+            triggered_ids = self.alert_index.crossed(symbol, price, change_percent)
+            for alert_id in triggered_ids:
+                alert = alerts_by_id.get(alert_id)
+                if alert:
+                    await self.handle_triggered_alert(alert, price, change_percent)
+            
+            # Throttle writes so a busy feed doesn't flood stock_price_history
+            tick_time = tick.get('timestamp', time.time())
+            write_due = symbol not in last_written or tick_time - last_written[symbol] >= history_interval
+            
+            # Indicator state advances on every tick but is only persisted with the history writes
+            indicator_triggers = await self.db.run(self.indicator_triggers, symbol, indicator_alerts.get(symbol, []),
+                                                   price, persist=write_due)
+            for alert in indicator_triggers:
+                await self.handle_triggered_alert(alert, price, change_percent)
+            if triggered_ids or indicator_triggers:
+                await self.db.run(self._sync_alert_index_signature)
+            
+            if write_due:
+                company_name = tick.get('company_name') or company_names.get(symbol, symbol)
+                self.update_stock_info(symbol, company_name, price, tick.get('volume'), change_percent)
+                last_written[symbol] = tick_time
+            
+            if should_stop and should_stop():
+                provider.close()
+                break
+        
+        await self.db.run(self.write_buffer.flush)
+        print(f"📡 Quote stream ended after {ticks} ticks")
+        return ticks
+
+    def get_price_history(self, symbol: str, start: datetime, end: datetime, max_points: int = 500) -> Dict:
+        """Get OHLCV bars for a symbol, at the finest resolution that fits max_points."""
+        return self.history.get_bars(symbol, start, end, max_points)
 
     def reset_triggered_alerts(self) -> None:
         """Reset all triggered alerts (useful for daily reset)."""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_connection(self.db_path)
         cursor = conn.cursor()
         
         cursor.execute('UPDATE stock_alerts SET is_triggered = 0')
         
         conn.commit()
         conn.close()
+        self.refresh_alert_index(force=True)
         print("All triggered alerts have been reset")
 
     def get_stock_stats(self, user_id: int) -> Dict:
-        """Get statistics about tracked stocks for a specific user."""
-        alerts = self.get_stock_alerts(user_id)
-        
-        total_alerts = len(alerts)
-        triggered_alerts = sum(1 for alert in alerts if alert['is_triggered'])
+        """Get statistics about tracked stocks for a specific user (from the user_stats counters)."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT total_stock_alerts, triggered_stock_alerts FROM user_stats WHERE user_id = ?',
+                       (user_id,))
+        total_alerts, triggered_alerts = cursor.fetchone() or (0, 0)
+        conn.close()
         monitoring_alerts = total_alerts - triggered_alerts
         
         return {
@@ -1,12 +1,11 @@
 # backend/tracker.py - FIXED VERSION WITH PROPER WALMART TARGETING & SAVINGS CALCULATION
 import asyncio
 import json
-import smtplib
 import sqlite3
 import time
 import random
 import re
-from datetime import datetime
+from datetime import datetime, timezone
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from pathlib import Path
@@ -14,6 +13,18 @@ from typing import Dict, List, Optional, Tuple, Any
 from urllib.parse import urlparse
 from playwright.async_api import async_playwright
 
+from async_db import database_thread
+from database import get_connection
+from downsample import lttb
+from fair_share import FairShareScheduler, UserLatency
+from migrations import run_migrations
+from notifier import alert_sender
+from price_stats import stats_to_dict
+from quarantine import PERMANENT_FAILURES, failures_to_dict, is_deferred
+from single_flight import SingleFlight
+from stock_history import parse_utc_string, to_utc_string
+from write_buffer import get_write_buffer
+
 
 class UltraStealthMultiPlatformScraper:
     """Ultra-stealth multi-platform scraper with FIXED Walmart price targeting"""
@@ -163,6 +174,9 @@ class UltraStealthMultiPlatformScraper:
             }
         }
         
+        # url -> failure class of its last failed scrape (see quarantine.FAILURE_CLASSES)
+        self.failures: Dict[str, str] = {}
+        
         # Ultra-realistic user agents
         self.user_agents = [
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
@@ -205,14 +219,14 @@ class UltraStealthMultiPlatformScraper:
             print(f"Error detecting platform: {e}")
             return None
     
-    async def setup_ultra_stealth_browser(self, platform: str):
+    async def setup_ultra_stealth_browser(self, platform: str, browser):
         """Ultra-stealth browser setup with maximum anti-detection"""
         try:
             user_agent = random.choice(self.user_agents)
             fingerprint = random.choice(self.fingerprints)
             
-            # Ultra-stealth context
-            context = await self.browser.new_context(
+            # Ultra-stealth context (in the caller's own browser, so concurrent scrapes don't share one)
+            context = await browser.new_context(
                 viewport=fingerprint['viewport'],
                 screen=fingerprint['screen'],
                 device_scale_factor=1,
@@ -599,13 +613,15 @@ class UltraStealthMultiPlatformScraper:
         platform = self.detect_platform(url)
         if not platform:
             print(f"Unsupported platform for URL: {url}")
+            self.failures[url] = 'unsupported'
             return None
         
         print(f"🕵️ ULTRA-STEALTH scraping {platform}: {url}")
+        self.failures[url] = 'error'  # Until we know better
         
         async with async_playwright() as p:
             # Maximum stealth browser launch
-            self.browser = await p.chromium.launch(
+            browser = await p.chromium.launch(
                 headless=True,
                 args=[
                     '--disable-blink-features=AutomationControlled',
@@ -620,7 +636,7 @@ class UltraStealthMultiPlatformScraper:
             )
             
             try:
-                page = await self.setup_ultra_stealth_browser(platform)
+                page = await self.setup_ultra_stealth_browser(platform, browser)
                 
                 print(f"🌐 Navigating to: {url}")
                 
@@ -633,7 +649,14 @@ class UltraStealthMultiPlatformScraper:
                             print(f"✅ Navigation successful")
                             navigation_success = True
                             break
+                        if response:
+                            print(f"❌ Navigation attempt {attempt + 1} got HTTP {response.status}")
+                            if response.status in (404, 410):
+                                self.failures[url] = 'gone'
+                                break  # Delisted; asking again won't bring it back
+                            self.failures[url] = 'blocked' if response.status in (403, 429, 503) else 'http_error'
                     except Exception as e:
+                        self.failures[url] = 'network'
                         print(f"❌ Navigation attempt {attempt + 1} failed: {e}")
                         if attempt < 2:
                             await asyncio.sleep(random.uniform(5, 10))
@@ -683,16 +706,18 @@ class UltraStealthMultiPlatformScraper:
                         print(f"✅ SUCCESS: {title[:50]}... - {int(price)} Robux")
                     else:
                         print(f"✅ SUCCESS: {title[:50]}... - ${price:.2f}")
+                    self.failures.pop(url, None)
                     return title, price
                 else:
                     print(f"❌ FAILED: Could not extract price for {platform}")
+                    self.failures[url] = 'no_price'
                     return None
                 
             except Exception as e:
                 print(f"❌ Error scraping {platform}: {str(e)}")
                 return None
             finally:
-                await self.browser.close()
+                await browser.close()
     
     @staticmethod
     def get_platform_info() -> Dict[str, Dict[str, str]]:
@@ -714,8 +739,11 @@ class UltraStealthRetryManager:
         self.max_retries = max_retries
         self.backoff_factor = backoff_factor
     
-    async def execute_with_retry(self, scraper_func, *args, **kwargs):
-        """Execute scraping function with ultra-patient retry logic"""
+    async def execute_with_retry(self, scraper_func, *args, should_retry=None, **kwargs):
+        """Execute scraping function with ultra-patient retry logic
+        
+        should_retry, if given, is asked after each empty result; False gives up at once.
+        """
         last_exception = None
         
         for attempt in range(self.max_retries):
@@ -723,6 +751,10 @@ class UltraStealthRetryManager:
                 result = await scraper_func(*args, **kwargs)
                 if result:
                     return result
+                
+                if should_retry and not should_retry():
+                    print(f"⛔ Attempt {attempt + 1} failed permanently - not retrying")
+                    return None
                     
                 if attempt < self.max_retries - 1:
                     wait_time = (self.backoff_factor ** attempt) + random.uniform(2, 8)
@@ -743,6 +775,12 @@ class UltraStealthRetryManager:
             raise last_exception
         return None
 
+# Shared by every StorenvyPriceTracker in the process (web app and scheduler threads)
+product_flight = SingleFlight('product_pages')
+
+# check_runs / check_run_items key of the product check run
+PRODUCT_CHECK_RUN = 'products'
+
 
 class StorenvyPriceTracker:
     """Multi-platform price tracker with FIXED savings calculation and chronological order"""
@@ -752,50 +790,15 @@ class StorenvyPriceTracker:
         self.scraper = UltraStealthMultiPlatformScraper()
         self.retry_manager = UltraStealthRetryManager(max_retries=3, backoff_factor=2.5)
         self.init_database()
+        self.write_buffer = get_write_buffer(self.db_path)
+        self.db = database_thread
+        # Round robin across users with no limits; the scheduler service applies the configured ones
+        self.fair_share = FairShareScheduler()
         
     def init_database(self) -> None:
         """Initialize SQLite database for storing tracked products"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Create main products table with user_id
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS tracked_products (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    url TEXT NOT NULL,
-                    platform TEXT,
-                    title TEXT,
-                    target_price REAL NOT NULL,
-                    last_price REAL,
-                    last_checked TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, url)
-                )
-            ''')
-            
-            # Check if user_id column exists and migrate if needed
-            cursor.execute("PRAGMA table_info(tracked_products)")
-            columns = [column[1] for column in cursor.fetchall()]
-            
-            if 'user_id' not in columns:
-                cursor.execute('ALTER TABLE tracked_products ADD COLUMN user_id INTEGER DEFAULT 1')
-                print("✅ Migrated database: Added user_id column")
-            
-            # Create price history table
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS price_history (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    product_id INTEGER,
-                    price REAL,
-                    checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (product_id) REFERENCES tracked_products (id)
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            run_migrations(self.db_path)
             print("✅ Database initialized successfully")
             
         except Exception as e:
@@ -810,7 +813,7 @@ class StorenvyPriceTracker:
             if not platform:
                 raise ValueError("Unsupported e-commerce platform")
             
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             cursor = conn.cursor()
             
             try:
@@ -841,18 +844,34 @@ class StorenvyPriceTracker:
     def delete_product(self, product_id: int, user_id: int) -> None:
         """Delete a tracked product for a specific user"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             cursor = conn.cursor()
             
             # Delete price history first
             cursor.execute('''
-                DELETE FROM price_history 
+                DELETE FROM price_runs
                 WHERE product_id IN (
                     SELECT id FROM tracked_products 
                     WHERE id = ? AND user_id = ?
                 )
             ''', (product_id, user_id))
             
+            cursor.execute('''
+                DELETE FROM product_price_stats
+                WHERE product_id IN (
+                    SELECT id FROM tracked_products
+                    WHERE id = ? AND user_id = ?
+                )
+            ''', (product_id, user_id))
+            
+            cursor.execute('''
+                DELETE FROM product_failures
+                WHERE product_id IN (
+                    SELECT id FROM tracked_products
+                    WHERE id = ? AND user_id = ?
+                )
+            ''', (product_id, user_id))
+            
             # Delete product
             cursor.execute('DELETE FROM tracked_products WHERE id = ? AND user_id = ?', (product_id, user_id))
             
@@ -867,22 +886,30 @@ class StorenvyPriceTracker:
     def get_tracked_products(self, user_id: int = None) -> List[Dict[str, Any]]:
         """Get all tracked products, optionally filtered by user - CHRONOLOGICAL ORDER"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             cursor = conn.cursor()
             
             if user_id:
                 # FIXED: Order by created_at DESC for chronological order (newest first)
                 cursor.execute('''
-                    SELECT id, url, platform, title, target_price, last_price, last_checked
-                    FROM tracked_products
-                    WHERE user_id = ?
-                    ORDER BY created_at DESC
+                    SELECT p.id, p.url, p.platform, p.title, p.target_price, p.last_price, p.last_checked,
+                           s.min_price, s.max_price, s.check_count, s.price_sum, s.ewma, s.window_low, s.last_change_at,
+                           f.consecutive_failures, f.failure_class, f.last_failure_at, f.next_check_at
+                    FROM tracked_products p
+                    LEFT JOIN product_price_stats s ON s.product_id = p.id
+                    LEFT JOIN product_failures f ON f.product_id = p.id
+                    WHERE p.user_id = ?
+                    ORDER BY p.created_at DESC
                 ''', (user_id,))
             else:
                 cursor.execute('''
-                    SELECT id, url, platform, title, target_price, last_price, last_checked
-                    FROM tracked_products
-                    ORDER BY created_at DESC
+                    SELECT p.id, p.url, p.platform, p.title, p.target_price, p.last_price, p.last_checked,
+                           s.min_price, s.max_price, s.check_count, s.price_sum, s.ewma, s.window_low, s.last_change_at,
+                           f.consecutive_failures, f.failure_class, f.last_failure_at, f.next_check_at
+                    FROM tracked_products p
+                    LEFT JOIN product_price_stats s ON s.product_id = p.id
+                    LEFT JOIN product_failures f ON f.product_id = p.id
+                    ORDER BY p.created_at DESC
                 ''')
             
             products = []
@@ -912,7 +939,10 @@ class StorenvyPriceTracker:
                         'target_price': row[4],
                         'last_price': row[5],
                         'last_checked': row[6],
-                        'status': status
+                        'status': status,
+                        'price_stats': stats_to_dict(row[7:14], row[5]),
+                        'failures': failures_to_dict(row[14:18]),
+                        'quarantined': is_deferred(row[17])
                     })
                     
                 except Exception as e:
@@ -926,18 +956,83 @@ class StorenvyPriceTracker:
             print(f"❌ Error getting tracked products: {e}")
             return []
 
+    def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        """Get a user's dashboard counters from user_stats (kept current by triggers, see migration 008)"""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT total_products, products_below_target, total_savings, total_stock_alerts, triggered_stock_alerts
+            FROM user_stats WHERE user_id = ?
+        ''', (user_id,))
+        row = cursor.fetchone() or (0, 0, 0.0, 0, 0)
+        conn.close()
+        
+        return {
+            'total_products': row[0],
+            'products_below_target': row[1],
+            'total_savings': round(row[2], 2),
+            'total_stock_alerts': row[3],
+            'triggered_stock_alerts': row[4],
+            'monitoring_stock_alerts': row[3] - row[4]
+        }
+
+    def begin_check_run(self, job: str = PRODUCT_CHECK_RUN) -> Tuple[float, set]:
+        """Open a checkpointed run, or pick up the one an interrupted run left open.
+        
+        Returns the run's start time and the ids of the items it has already finished.
+        """
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT started_at FROM check_runs WHERE job = ?', (job,))
+            row = cursor.fetchone()
+            if row:
+                started_at = row[0]
+            else:
+                started_at = time.time()
+                cursor.execute('INSERT INTO check_runs (job, started_at) VALUES (?, ?)', (job, started_at))
+            cursor.execute('SELECT item_id FROM check_run_items WHERE job = ?', (job,))
+            done = {item_id for item_id, in cursor.fetchall()}
+            conn.commit()
+            return started_at, done
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+    
+    def finish_check_run(self, job: str = PRODUCT_CHECK_RUN) -> None:
+        """Close a checkpointed run once every item is done (commit its write-buffered results first)."""
+        conn = get_connection(self.db_path)
+        conn.execute('DELETE FROM check_run_items WHERE job = ?', (job,))
+        conn.execute('DELETE FROM check_runs WHERE job = ?', (job,))
+        conn.commit()
+        conn.close()
+    
+    def has_interrupted_check_run(self, job: str = PRODUCT_CHECK_RUN) -> bool:
+        """True if a run was stopped or crashed before finishing (it resumes on the next check)."""
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1 FROM check_runs WHERE job = ?', (job,))
+        row = cursor.fetchone()
+        conn.close()
+        return row is not None
+    
     def get_all_products_for_checking(self) -> List[Dict[str, Any]]:
         """Get all products from all users for checking - CHRONOLOGICAL ORDER"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            conn = get_connection(self.db_path)
             cursor = conn.cursor()
             
             # FIXED: Order by created_at DESC for chronological order (newest first)
             cursor.execute('''
                 SELECT p.id, p.user_id, p.url, p.platform, p.title, p.target_price, 
-                       p.last_price, p.last_checked, u.email, u.smtp_password, u.first_name
+                       p.last_price, p.last_checked, u.email, u.smtp_password, u.first_name,
+                       f.consecutive_failures, f.next_check_at
                 FROM tracked_products p
                 JOIN users u ON p.user_id = u.id
+                LEFT JOIN product_failures f ON f.product_id = p.id
                 ORDER BY p.created_at DESC
             ''')
             
@@ -965,7 +1060,9 @@ class StorenvyPriceTracker:
                         'last_checked': row[7],
                         'user_email': row[8],
                         'smtp_password': row[9],
-                        'user_name': row[10]
+                        'user_name': row[10],
+                        'consecutive_failures': row[11] or 0,
+                        'next_check_at': row[12]
                     })
                     
                 except Exception as e:
@@ -980,36 +1077,61 @@ class StorenvyPriceTracker:
             return []
     
     def update_product_info(self, product_id: int, title: str, price: float) -> None:
-        """Update product information after scraping"""
+        """Queue product information after scraping (committed in batches by the write buffer)"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Update product
-            cursor.execute('''
-                UPDATE tracked_products
-                SET title = ?, last_price = ?, last_checked = ?
-                WHERE id = ?
-            ''', (title, price, datetime.now().isoformat(), product_id))
-            
-            # Add to price history
-            cursor.execute('''
-                INSERT INTO price_history (product_id, price)
-                VALUES (?, ?)
-            ''', (product_id, price))
-            
-            conn.commit()
-            conn.close()
+            self.write_buffer.add_product_update(product_id, title, price)
             
         except Exception as e:
             print(f"❌ Error updating product {product_id}: {e}")
     
+    def get_price_history(self, product_id: int, user_id: int, start: datetime, end: datetime,
+                          max_points: int = 500) -> Optional[Dict[str, Any]]:
+        """Get a product's price points between start and end, downsampled with LTTB to max_points.
+        
+        Each price run contributes its first and last check (clipped to the range), so
+        the cost depends on how often the price moved, not on how often it was checked.
+        Returns None if the product doesn't belong to the user.
+        """
+        conn = get_connection(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT 1 FROM tracked_products WHERE id = ? AND user_id = ?', (product_id, user_id))
+        if not cursor.fetchone():
+            conn.close()
+            return None
+        
+        start_at, end_at = to_utc_string(start), to_utc_string(end)
+        cursor.execute('''
+            SELECT price, first_seen, last_seen FROM price_runs
+            WHERE product_id = ? AND last_seen >= ? AND first_seen <= ?
+            ORDER BY last_seen, id
+        ''', (product_id, start_at, end_at))
+        
+        points = []
+        for price, first_seen, last_seen in cursor:
+            for checked_at in dict.fromkeys((max(first_seen, start_at), min(last_seen, end_at))):
+                epoch = parse_utc_string(checked_at).replace(tzinfo=timezone.utc).timestamp()
+                points.append((epoch, price))
+        conn.close()
+        
+        sampled = lttb(points, max_points)
+        return {
+            'product_id': product_id,
+            'total_points': len(points),
+            'downsampled': len(sampled) < len(points),
+            'points': [{
+                'time': datetime.fromtimestamp(epoch, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                'price': price
+            } for epoch, price in sampled]
+        }
+    
     async def scrape_product_with_ultra_stealth(self, url: str) -> Optional[Tuple[str, float]]:
         """Scrape product with ultra-stealth retry logic"""
         try:
             result = await self.retry_manager.execute_with_retry(
                 self.scraper.scrape_product, 
-                url
+                url,
+                should_retry=lambda: self.failure_class(url) not in PERMANENT_FAILURES
             )
             
             if result:
@@ -1023,6 +1145,7 @@ class StorenvyPriceTracker:
                         return result
                     else:
                         print(f"⚠️ Walmart price validation failed: {price}")
+                        self.scraper.failures[url] = 'no_price'
                         return None
                 elif platform == 'etsy' and price:
                     if 1.0 <= price <= 10000.0:
@@ -1030,6 +1153,7 @@ class StorenvyPriceTracker:
                         return result
                     else:
                         print(f"⚠️ Etsy price validation failed: {price}")
+                        self.scraper.failures[url] = 'no_price'
                         return None
                 
                 return result
@@ -1040,51 +1164,51 @@ class StorenvyPriceTracker:
             print(f"❌ Ultra-stealth scraping failed for {url}: {e}")
             return None
 
+    def failure_class(self, url: str) -> str:
+        """Why the last scrape of url failed (one of quarantine.FAILURE_CLASSES)"""
+        return self.scraper.failures.get(url, 'error')
+    
     async def scrape_product(self, url: str) -> Optional[Tuple[str, float]]:
-        """Main scraping method using ultra-stealth scraper"""
+        """Main scraping method using ultra-stealth scraper (concurrent calls per URL share one scrape)"""
         try:
-            return await self.scrape_product_with_ultra_stealth(url)
+            return await product_flight.do(url, self.scrape_product_with_ultra_stealth, url)
         except Exception as e:
             print(f"❌ Error scraping product {url}: {e}")
             return None
     
-    def send_email_alert(self, product: Dict[str, Any], user_email: str, smtp_password: str, user_name: str) -> None:
-        """Send email alert for price drop with enhanced formatting"""
-        if not smtp_password:
-            return
+    def build_email_alert(self, product: Dict[str, Any], user_email: str, user_name: str) -> MIMEMultipart:
+        """Build the price drop alert email with enhanced formatting"""
+        # Create message
+        msg = MIMEMultipart()
+        msg['From'] = user_email
+        msg['To'] = user_email
         
-        try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = user_email
-            msg['To'] = user_email
-            
-            platform = product.get('platform', 'storenvy')
-            platform_name = product.get('platform_name', 'Unknown Platform')
-            
-            # Enhanced subject line
-            if platform == 'roblox':
-                msg['Subject'] = f"🎮 Roblox Deal Alert: {product['title'][:40]}..."
-            else:
-                msg['Subject'] = f"🛍️ Price Drop Alert: {product['title'][:40]}..."
-            
-            # Format prices based on platform
-            is_robux = platform == 'roblox'
-            
-            if is_robux:
-                current_price_str = f"{int(product['last_price'])} Robux"
-                target_price_str = f"{int(product['target_price'])} Robux"
-                savings_str = f"{int(product['target_price'] - product['last_price'])} Robux"
-                currency_emoji = "🎮"
-            else:
-                current_price_str = f"${product['last_price']:.2f}"
-                target_price_str = f"${product['target_price']:.2f}"
-                savings_str = f"${product['target_price'] - product['last_price']:.2f}"
-                currency_emoji = "💰"
-            
-            # Enhanced email body
-            if platform == 'roblox':
-                body = f"""
+        platform = product.get('platform', 'storenvy')
+        platform_name = product.get('platform_name', 'Unknown Platform')
+        
+        # Enhanced subject line
+        if platform == 'roblox':
+            msg['Subject'] = f"🎮 Roblox Deal Alert: {product['title'][:40]}..."
+        else:
+            msg['Subject'] = f"🛍️ Price Drop Alert: {product['title'][:40]}..."
+        
+        # Format prices based on platform
+        is_robux = platform == 'roblox'
+        
+        if is_robux:
+            current_price_str = f"{int(product['last_price'])} Robux"
+            target_price_str = f"{int(product['target_price'])} Robux"
+            savings_str = f"{int(product['target_price'] - product['last_price'])} Robux"
+            currency_emoji = "🎮"
+        else:
+            current_price_str = f"${product['last_price']:.2f}"
+            target_price_str = f"${product['target_price']:.2f}"
+            savings_str = f"${product['target_price'] - product['last_price']:.2f}"
+            currency_emoji = "💰"
+        
+        # Enhanced email body
+        if platform == 'roblox':
+            body = f"""
 Hello {user_name}! 🎮
 
 🚨 ROBLOX DEAL ALERT! 🚨
@@ -1108,9 +1232,9 @@ Happy gaming! This deal was found by TagTracker's ultra-stealth monitoring syste
 
 Best regards,
 TagTracker Team 🤖
-                """
-            else:
-                body = f"""
+            """
+        else:
+            body = f"""
 Hello {user_name}! 🛍️
 
 🚨 PRICE DROP ALERT! 🚨
@@ -1136,94 +1260,159 @@ Happy shopping! 🎉
 
 Best regards,
 TagTracker Team 🤖
-                """
-            
-            msg.attach(MIMEText(body, 'plain'))
-            
-            # Send email using Gmail SMTP with enhanced error handling
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(user_email, smtp_password)
-            server.send_message(msg)
-            server.quit()
-            
-            print(f"📧 Ultra-stealth alert sent to {user_name} for {platform_name}")
+            """
+        
+        msg.attach(MIMEText(body, 'plain'))
+        return msg
+    
+    async def send_email_alert(self, product: Dict[str, Any], user_email: str, smtp_password: str,
+                               user_name: str) -> None:
+        """Send email alert for price drop, off the event loop over the account's reused SMTP connection"""
+        if not smtp_password:
+            return
+        
+        try:
+            await alert_sender.send(self.build_email_alert(product, user_email, user_name), user_email, smtp_password)
+            print(f"📧 Ultra-stealth alert sent to {user_name} for {product.get('platform_name', 'Unknown Platform')}")
             
         except Exception as e:
             print(f"❌ Failed to send email alert: {str(e)}")
     
-    async def check_all_products(self) -> None:
-        """Check all tracked products with ultra-stealth capabilities - CHRONOLOGICAL ORDER"""
+    async def check_all_products(self) -> Dict[str, Any]:
+        """Check all tracked products with ultra-stealth capabilities, taking turns between users
+        
+        Each user's products are checked in chronological order, but users take turns
+        (see fair_share.FairShareScheduler), so one user adding hundreds of products
+        doesn't hold everyone else's checks back.
+        
+        Every finished product is checkpointed with its result. A run that is drained
+        (fair_share.drain(), on shutdown) or crashes stays open, and the next call
+        resumes it, skipping the products it already did. Returns how many products
+        were updated ('items') and failed ('failures'), per-user latency ('users') and
+        whether the run was left unfinished ('interrupted').
+        
+        Failures are counted per product; a product that keeps failing is skipped
+        until its deferred check time (see quarantine.py), and a success clears it.
+        """
         try:
-            products = self.get_all_products_for_checking()
+            due_at, done = await self.db.run(self.begin_check_run)
+            products = await self.db.run(self.get_all_products_for_checking)
+            
+            if done:
+                print(f"↩️ Resuming an interrupted product check: {len(done)} products already done")
+                products = [product for product in products if product['id'] not in done]
+            
+            # Products that keep failing wait out their deferral (see quarantine.py)
+            quarantined = [product for product in products if is_deferred(product['next_check_at'])]
+            if quarantined:
+                print(f"🚧 Skipping {len(quarantined)} quarantined products until their deferred check time")
+                products = [product for product in products if not is_deferred(product['next_check_at'])]
             
             if not products:
                 print("ℹ️ No products to check")
-                return
+                await self.db.run(self.finish_check_run)
+                return {'items': 0, 'failures': 0, 'users': {}, 'interrupted': False}
+            
+            if self.fair_share.quota:
+                # Least recently checked first, so products deferred by the quota go first next run
+                products.sort(key=lambda product: product['last_checked'] or '')
             
-            print(f"🔄 Ultra-stealth checking {len(products)} products in chronological order...")
+            plan, deferred = self.fair_share.plan(products, key=lambda product: product['id'],
+                                                  owners=lambda product: [product['user_id']])
+            latency = UserLatency(due_at)
+            for product in deferred:
+                latency.deferred[product['user_id']] += 1
             
-            # FIXED: NO MORE RANDOMIZATION - Keep chronological order as requested
-            # Products are already ordered by created_at DESC from the query
+            print(f"🔄 Ultra-stealth checking {len(plan)} products for {len({u for u, _ in plan})} users, "
+                  f"taking turns ({len(deferred)} deferred by the per-user quota)...")
             
-            for i, product in enumerate(products):
+            position = iter(range(1, len(plan) + 1))
+            
+            async def check(product: Dict[str, Any]) -> bool:
+                ok = await check_product(product)
+                # Failures count as done too: the run moves on, and the product is tried next run
+                self.write_buffer.add_checkpoint(PRODUCT_CHECK_RUN, product['id'])
+                return ok
+            
+            async def check_product(product: Dict[str, Any]) -> bool:
                 try:
                     platform_name = product.get('platform_name', 'Unknown')
                     platform = product.get('platform', 'unknown')
                     
-                    print(f"📦 [{i+1}/{len(products)}] Ultra-stealth checking {platform_name}: {product['url'][:60]}...")
+                    print(f"📦 [{next(position)}/{len(plan)}] Ultra-stealth checking {platform_name}: {product['url'][:60]}...")
                     
                     # Ultra-stealth scraping with enhanced accuracy
                     result = await self.scrape_product(product['url'])
                     
-                    if result:
-                        title, current_price = result
-                        
-                        # Update database
-                        self.update_product_info(product['id'], title, current_price)
-                        
-                        # Enhanced logging
+                    if not result:
+                        failure_class = self.failure_class(product['url'])
+                        print(f"❌ Failed to scrape {platform_name} product ({failure_class}, "
+                              f"{product['consecutive_failures'] + 1} in a row)")
+                        self.write_buffer.add_product_failure(product['id'], failure_class)
+                        return False
+                    
+                    title, current_price = result
+                    
+                    # Update database
+                    self.update_product_info(product['id'], title, current_price)
+                    
+                    # Enhanced logging
+                    if platform == 'roblox':
+                        print(f"✅ Updated {platform_name}: {title[:40]}... - {int(current_price)} Robux")
+                    else:
+                        print(f"✅ Updated {platform_name}: {title[:40]}... - ${current_price:.2f}")
+                    
+                    # Check if price dropped below target
+                    if current_price <= product['target_price']:
                         if platform == 'roblox':
-                            print(f"✅ Updated {platform_name}: {title[:40]}... - {int(current_price)} Robux")
+                            print(f"🎮 ROBLOX DEAL ALERT! {title[:40]}... hit target price!")
                         else:
-                            print(f"✅ Updated {platform_name}: {title[:40]}... - ${current_price:.2f}")
+                            print(f"🎉 DEAL ALERT! {title[:40]}... hit target price!")
                         
-                        # Check if price dropped below target
-                        if current_price <= product['target_price']:
-                            if platform == 'roblox':
-                                print(f"🎮 ROBLOX DEAL ALERT! {title[:40]}... hit target price!")
-                            else:
-                                print(f"🎉 DEAL ALERT! {title[:40]}... hit target price!")
-                            
-                            # Update product for email
-                            product['title'] = title
-                            product['last_price'] = current_price
-                            
-                            # Send email alert if configured
-                            if product.get('smtp_password'):
-                                self.send_email_alert(
-                                    product, 
-                                    product['user_email'],
-                                    product['smtp_password'],
-                                    product['user_name']
-                                )
-                    else:
-                        print(f"❌ Failed to scrape {platform_name} product")
+                        # Update product for email
+                        product['title'] = title
+                        product['last_price'] = current_price
+                        
+                        # Send email alert if configured
+                        if product.get('smtp_password'):
+                            await self.send_email_alert(
+                                product, 
+                                product['user_email'],
+                                product['smtp_password'],
+                                product['user_name']
+                            )
+                    return True
                 
                 except Exception as e:
                     print(f"❌ Error checking product {product.get('id', 'unknown')}: {str(e)}")
-                    continue
-                
-                # Ultra-stealth rate limiting with randomization
-                if i < len(products) - 1:  # Don't wait after the last product
-                    delay = random.uniform(8, 15)  # Longer delays for maximum stealth
-                    print(f"⏳ Ultra-stealth delay: {delay:.1f}s before next check...")
-                    await asyncio.sleep(delay)
-            
-            print(f"✅ Ultra-stealth checking completed for all {len(products)} products")
+                    self.write_buffer.add_product_failure(product['id'], 'error')
+                    return False
+            
+            async def stealth_delay() -> None:
+                # Ultra-stealth rate limiting with randomization (not after the last product)
+                delay = random.uniform(8, 15)  # Longer delays for maximum stealth
+                print(f"⏳ Ultra-stealth delay: {delay:.1f}s before next check...")
+                await asyncio.sleep(delay)
+            
+            completed = await self.fair_share.run(plan, check, owners=lambda product: [product['user_id']],
+                                                  latency=latency, pause=stealth_delay)
+            
+            await self.db.run(self.write_buffer.flush)
+            await alert_sender.close()  # Log out of the SMTP connections this run's alerts opened
+            
+            users = latency.report()
+            checked = sum(user['checked'] for user in users.values())
+            failed = sum(user['failed'] for user in users.values())
+            if completed:
+                await self.db.run(self.finish_check_run)
+                print(f"✅ Ultra-stealth checking completed for {len(plan)} products")
+            else:
+                print(f"⏸️ Product check stopped after {checked} of {len(plan)} products - will resume next run")
+            return {'items': checked - failed, 'failures': failed, 'users': users, 'interrupted': not completed}
             
         except Exception as e:
             print(f"❌ Error in ultra-stealth check_all_products: {e}")
+            raise
     
     def get_supported_platforms(self) -> Dict[str, Dict[str, str]]:
         """Get information about supported platforms"""
@@ -0,0 +1,306 @@
+# backend/write_buffer.py - Group-commit write-behind buffer for scrape results
+import atexit
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+from database import DEFAULT_DB_PATH, close_all_connections, get_connection
+from migrations import run_migrations
+from price_stats import update_price_stats
+from quarantine import clear_product_failures, record_product_failure
+
+
+def utc_timestamp() -> str:
+    """Current time in SQLite CURRENT_TIMESTAMP format, taken when the result arrives."""
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def record_price_check(cursor: sqlite3.Cursor, product_id: int, price: float, checked_at: str) -> bool:
+    """Add one check to the product's price runs: extend the current run, or start a new one if the price moved.
+
+    Returns False if the product no longer exists.
+    """
+    cursor.execute('''
+        SELECT id, price FROM price_runs
+        WHERE product_id = ?
+        ORDER BY last_seen DESC, id DESC LIMIT 1
+    ''', (product_id,))
+    current = cursor.fetchone()
+
+    if current and current[1] == price:
+        cursor.execute('''
+            UPDATE price_runs
+            SET last_seen = MAX(last_seen, ?), check_count = check_count + 1
+            WHERE id = ?
+        ''', (checked_at, current[0]))
+        return True
+
+    # Skip history for products deleted while their update was queued
+    cursor.execute('''
+        INSERT INTO price_runs (product_id, price, first_seen, last_seen)
+        SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM tracked_products WHERE id = ?)
+    ''', (product_id, price, checked_at, checked_at, product_id))
+    return cursor.rowcount > 0
+
+
+class WriteBehindBuffer:
+    """Collects price updates from any number of scrape tasks and commits them in batches.
+
+    Updates are flushed by a background thread every flush_interval seconds, or as
+    soon as max_pending updates are queued, as a single transaction of executemany
+    statements. flush() forces a synchronous flush (used at the end of each run and
+    at shutdown). Run checkpoints are queued here too, so an item is only marked done
+    in the same transaction that commits its result.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, flush_interval: float = 1.0, max_pending: int = 200):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+
+        self.flushed_batches = 0
+        self.flushed_rows = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self._reset()
+
+    def _reset(self) -> None:
+        """Fresh locks and an empty queue; the flusher thread starts on the first update.
+
+        Also used in forked web workers, where the parent's thread doesn't exist and its
+        queued updates are the parent's to flush.
+        """
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._product_updates: List[Tuple] = []
+        self._stock_updates: List[Tuple] = []
+        self._checkpoints: List[Tuple] = []
+        self._failures: List[Tuple] = []
+        self._running = True
+        self._thread = None
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._flush_worker, daemon=True, name="WriteBehindFlusher")
+            self._thread.start()
+
+    @property
+    def queue_depth(self) -> int:
+        with self._lock:
+            return (len(self._product_updates) + len(self._stock_updates)
+                    + len(self._checkpoints) + len(self._failures))
+
+    def add_product_update(self, product_id: int, title: str, price: float) -> None:
+        """Queue a scraped product price (tracked_products update + price run check)."""
+        with self._lock:
+            self._ensure_flusher()
+            self._product_updates.append((product_id, title, price, datetime.now().isoformat(), utc_timestamp()))
+            full = len(self._product_updates) + len(self._stock_updates) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def add_stock_update(self, symbol: str, company_name: str, price: float,
+                         volume: int = None, change_percent: float = None) -> None:
+        """Queue a stock quote (stock_alerts update + stock_price_history row)."""
+        with self._lock:
+            self._ensure_flusher()
+            self._stock_updates.append((symbol, company_name, price, volume, change_percent,
+                                        datetime.now(), utc_timestamp()))
+            full = len(self._product_updates) + len(self._stock_updates) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def add_product_failure(self, product_id: int, failure_class: str) -> None:
+        """Queue a failed product check (product_failures update, see quarantine.py)."""
+        with self._lock:
+            self._ensure_flusher()
+            self._failures.append((product_id, failure_class, time.time()))
+
+    def add_checkpoint(self, job: str, item_id: int) -> None:
+        """Queue an item as done in the job's open checkpointed run (see tracker.begin_check_run)."""
+        with self._lock:
+            self._ensure_flusher()
+            self._checkpoints.append((job, item_id, time.time(), job))
+
+    def _flush_worker(self) -> None:
+        while self._running:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Write-behind flush failed, will retry: {e}")
+
+    def flush(self) -> int:
+        """Commit everything queued so far in one transaction. Returns the number of updates written."""
+        with self._flush_lock:
+            with self._lock:
+                products, self._product_updates = self._product_updates, []
+                stocks, self._stock_updates = self._stock_updates, []
+                checkpoints, self._checkpoints = self._checkpoints, []
+                failures, self._failures = self._failures, []
+
+            if not products and not stocks and not checkpoints and not failures:
+                return 0
+
+            start = time.perf_counter()
+            conn = get_connection(self.db_path)
+            cursor = conn.cursor()
+
+            try:
+                if products:
+                    cursor.executemany('''
+                        UPDATE tracked_products
+                        SET title = ?, last_price = ?, last_checked = ?
+                        WHERE id = ?
+                    ''', [(title, price, checked, product_id) for product_id, title, price, checked, _ in products])
+
+                    update_price_stats(cursor, [
+                        (product_id, price, at) for product_id, _, price, _, at in products
+                        if record_price_check(cursor, product_id, price, at)
+                    ])
+
+                    clear_product_failures(cursor, {product_id for product_id, *_ in products})
+
+                for product_id, failure_class, failed_at in failures:
+                    record_product_failure(cursor, product_id, failure_class, failed_at)
+
+                if stocks:
+                    cursor.executemany('''
+                        UPDATE stock_alerts
+                        SET company_name = ?, current_price = ?, last_checked = ?
+                        WHERE symbol = ?
+                    ''', [(name, price, checked, symbol) for symbol, name, price, _, _, checked, _ in stocks])
+
+                    cursor.executemany('''
+                        INSERT INTO stock_price_history (symbol, price, volume, change_percent, checked_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', [(symbol, price, volume, change, at) for symbol, _, price, volume, change, _, at in stocks])
+
+                if checkpoints:
+                    # Ignored once the run has finished (a late flush must not reopen it)
+                    cursor.executemany('''
+                        INSERT OR IGNORE INTO check_run_items (job, item_id, done_at)
+                        SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM check_runs WHERE job = ?)
+                    ''', checkpoints)
+
+                conn.commit()
+
+            except Exception:
+                conn.rollback()
+                self.failed_flushes += 1
+                # Put the batch back in front of anything queued meanwhile
+                with self._lock:
+                    self._product_updates = products + self._product_updates
+                    self._stock_updates = stocks + self._stock_updates
+                    self._checkpoints = checkpoints + self._checkpoints
+                    self._failures = failures + self._failures
+                raise
+            finally:
+                conn.close()
+
+            written = len(products) + len(stocks) + len(checkpoints) + len(failures)
+            self.flushed_batches += 1
+            self.flushed_rows += written
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+            return written
+
+    def close(self) -> None:
+        """Stop the background flusher after a final flush."""
+        self._running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self) -> Dict:
+        return {
+            'queue_depth': self.queue_depth,
+            'flushed_batches': self.flushed_batches,
+            'flushed_rows': self.flushed_rows,
+            'failed_flushes': self.failed_flushes,
+            'last_flush_ms': round(self.last_flush_ms, 2),
+        }
+
+
+_buffers: Dict[str, WriteBehindBuffer] = {}
+_buffers_lock = threading.Lock()
+
+
+def get_write_buffer(db_path: str = DEFAULT_DB_PATH) -> WriteBehindBuffer:
+    """Get the process-wide write-behind buffer for db_path."""
+    with _buffers_lock:
+        buffer = _buffers.get(db_path)
+        if buffer is None:
+            buffer = _buffers[db_path] = WriteBehindBuffer(db_path)
+        return buffer
+
+
+def close_all_buffers() -> None:
+    """Final flush and stop for every buffer (shutdown)."""
+    with _buffers_lock:
+        buffers = list(_buffers.values())
+        _buffers.clear()
+    for buffer in buffers:
+        try:
+            buffer.close()
+        except Exception as e:
+            print(f"❌ Final write-behind flush failed: {e}")
+
+
+def _reset_buffers_after_fork() -> None:
+    global _buffers_lock
+    _buffers_lock = threading.Lock()
+    for buffer in _buffers.values():
+        buffer._reset()
+
+
+atexit.register(close_all_buffers)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_buffers_after_fork)
+
+
+def benchmark_write_buffer(updates: int = 2000) -> None:
+    """Compare one commit per scrape result against the group-committed buffer."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'buffer.db')
+        run_migrations(path)
+        conn = get_connection(path)
+        conn.executemany('INSERT INTO tracked_products (user_id, url, target_price) VALUES (1, ?, 10)',
+                         [(f'https://example.com/{i}',) for i in range(100)])
+        conn.commit()
+
+        start = time.perf_counter()
+        for i in range(updates):
+            conn = get_connection(path)
+            conn.execute('UPDATE tracked_products SET title = ?, last_price = ?, last_checked = ? WHERE id = ?',
+                         ('Item', float(i), datetime.now().isoformat(), i % 100 + 1))
+            cursor = conn.cursor()
+            at = utc_timestamp()
+            if record_price_check(cursor, i % 100 + 1, float(i % 3), at):
+                update_price_stats(cursor, [(i % 100 + 1, float(i % 3), at)])
+            conn.commit()
+            conn.close()
+        per_row = time.perf_counter() - start
+
+        buffer = WriteBehindBuffer(path, flush_interval=0.5)
+        start = time.perf_counter()
+        for i in range(updates):
+            buffer.add_product_update(i % 100 + 1, 'Item', float(i % 3))
+        buffer.close()
+        batched = time.perf_counter() - start
+
+        print(f"{updates} scrape results:")
+        print(f"  commit per result: {per_row * 1000:8.1f} ms")
+        print(f"  write-behind:      {batched * 1000:8.1f} ms in {buffer.flushed_batches} transactions"
+              f" ({per_row / batched:.1f}x faster)")
+        close_all_connections()
+
+
+if __name__ == "__main__":
+    benchmark_write_buffer()
@@ -0,0 +1,184 @@
+# backend/wsgi.py - Production entry point: the Flask app under a multi-worker WSGI server
+#
+#   python wsgi.py                       # gunicorn, WEB_WORKERS processes x WEB_THREADS threads
+#   python wsgi.py --workers 4 --threads 8
+#   gunicorn -w 4 --threads 8 -k gthread --preload wsgi:application
+#   python wsgi.py --benchmark           # load test against the Werkzeug dev server
+#
+# On Windows (no fork) it falls back to waitress with WEB_THREADS threads in one process.
+# By default the web workers don't start the scheduler; run scheduler_service.py as its own service,
+# or set START_SCHEDULER_FROM_WEB=True (service_app.py does): the scheduler lease keeps it to one
+# active instance across the workers either way.
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+# Must be settled before the app module is imported by the master or any worker
+os.environ.setdefault('START_SCHEDULER_FROM_WEB', 'False')
+os.environ.setdefault('SECRET_KEY', secrets.token_hex(32))  # Inherited by every worker
+
+from config import Config
+from app import app as application
+
+try:
+    from gunicorn.app.base import BaseApplication
+    GUNICORN_AVAILABLE = True
+except ImportError:  # Windows, or gunicorn not installed
+    BaseApplication = object
+    GUNICORN_AVAILABLE = False
+
+try:
+    import waitress
+    WAITRESS_AVAILABLE = True
+except ImportError:
+    WAITRESS_AVAILABLE = False
+
+
+def default_workers() -> int:
+    return Config.WEB_WORKERS or (os.cpu_count() or 1) * 2 + 1
+
+
+class GunicornServer(BaseApplication):
+    """Runs the already-imported app under gunicorn's pre-fork gthread workers.
+
+    The app module is loaded once in the master (preload). Its import-time work
+    (migrations, tracker and scheduler construction) opens no threads, and the
+    database connections, write buffers and executors reset themselves in each
+    forked worker.
+    """
+
+    def __init__(self, wsgi_app, options: dict):
+        self.wsgi_app = wsgi_app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return self.wsgi_app
+
+
+def serve(host: str = Config.WEB_HOST, port: int = Config.WEB_PORT,
+          workers: int = 0, threads: int = Config.WEB_THREADS) -> None:
+    """Serve the app with gunicorn (or waitress where gunicorn isn't available)."""
+    workers = workers or default_workers()
+
+    if GUNICORN_AVAILABLE:
+        print(f"🚀 Serving on http://{host}:{port} with gunicorn: {workers} workers x {threads} threads")
+        GunicornServer(application, {
+            'bind': f'{host}:{port}',
+            'workers': workers,
+            'threads': threads,
+            'worker_class': 'gthread',
+            'preload_app': True,
+            'timeout': 120,
+            'accesslog': None,
+            'errorlog': '-',
+        }).run()
+    elif WAITRESS_AVAILABLE:
+        print(f"🚀 Serving on http://{host}:{port} with waitress: {threads} threads")
+        waitress.serve(application, host=host, port=port, threads=threads)
+    else:
+        print("❌ No production WSGI server installed: pip install gunicorn (or waitress on Windows)")
+        sys.exit(1)
+
+
+def benchmark_servers(requests: int = 3000, concurrency: int = 32, workers: int = 4, threads: int = 8) -> None:
+    """Load-test the dev server against the production server on the same endpoints."""
+    paths = ['/api/auth/session', '/api/stats', '/']
+
+    def load_test(port: int) -> dict:
+        latencies = []
+        errors = [0]
+        lock = threading.Lock()
+        counter = iter(range(requests))
+
+        def client():
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                start = time.perf_counter()
+                try:
+                    urllib.request.urlopen(f'http://127.0.0.1:{port}{paths[i % len(paths)]}', timeout=30).read()
+                    with lock:
+                        latencies.append(time.perf_counter() - start)
+                except Exception:
+                    with lock:
+                        errors[0] += 1
+
+        start = time.perf_counter()
+        clients = [threading.Thread(target=client) for _ in range(concurrency)]
+        for t in clients:
+            t.start()
+        for t in clients:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            'rps': len(latencies) / elapsed,
+            'p50': latencies[len(latencies) // 2] * 1000 if latencies else 0,
+            'p95': latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0,
+            'errors': errors[0],
+        }
+
+    def wait_until_up(port: int) -> None:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/api/auth/session', timeout=1).read()
+                return
+            except Exception:
+                time.sleep(0.2)
+        raise RuntimeError(f"Server on port {port} did not start")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_PATH=os.path.join(tmp, 'bench.db'), START_SCHEDULER_FROM_WEB='False')
+        script = str(Path(__file__).resolve())
+        servers = [
+            ('Werkzeug dev server', 5101, [sys.executable, script, '--dev', '--port', '5101']),
+            (f'wsgi.py ({workers} workers x {threads} threads)', 5102,
+             [sys.executable, script, '--port', '5102', '--workers', str(workers), '--threads', str(threads)]),
+        ]
+
+        print(f"{requests} requests, {concurrency} concurrent clients, paths {paths}:")
+        for name, port, command in servers:
+            server = subprocess.Popen(command, env=env, cwd=tmp, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                wait_until_up(port)
+                result = load_test(port)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+            print(f"  {name:40s} {result['rps']:8.0f} req/s   p50 {result['p50']:7.1f} ms"
+                  f"   p95 {result['p95']:7.1f} ms   errors {result['errors']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run PriceTracker under a production WSGI server')
+    parser.add_argument('--host', default=Config.WEB_HOST)
+    parser.add_argument('--port', type=int, default=Config.WEB_PORT)
+    parser.add_argument('--workers', type=int, default=Config.WEB_WORKERS)
+    parser.add_argument('--threads', type=int, default=Config.WEB_THREADS)
+    parser.add_argument('--dev', action='store_true', help='Run the Werkzeug dev server instead (benchmark baseline)')
+    parser.add_argument('--benchmark', action='store_true', help='Load-test the dev server against this server')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark_servers()
+    elif args.dev:
+        application.run(host=args.host, port=args.port, debug=False, use_reloader=False)
+    else:
+        serve(args.host, args.port, args.workers, args.threads)
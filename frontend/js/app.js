@@ -730,7 +730,15 @@ const dataManager = {
             'price_above': `Alert when price rises above $${alert.threshold}`,
             'price_below': `Alert when price drops below $${alert.threshold}`,
             'percent_up': `Alert when price increases by ${alert.threshold}%`,
-            'percent_down': `Alert when price decreases by ${alert.threshold}%`
+            'percent_down': `Alert when price decreases by ${alert.threshold}%`,
+            'sma_cross_above': `Alert when price crosses above its ${alert.threshold}-day SMA`,
+            'sma_cross_below': `Alert when price crosses below its ${alert.threshold}-day SMA`,
+            'ema_cross_above': `Alert when price crosses above its ${alert.threshold}-day EMA`,
+            'ema_cross_below': `Alert when price crosses below its ${alert.threshold}-day EMA`,
+            'new_high': `Alert on a new ${alert.threshold}-day high`,
+            'new_low': `Alert on a new ${alert.threshold}-day low`,
+            'bollinger_upper': `Alert when price breaks above the ${alert.threshold}-day Bollinger band`,
+            'bollinger_lower': `Alert when price breaks below the ${alert.threshold}-day Bollinger band`
         };
         return descriptions[alert.alert_type] || 'Custom alert';
     },
@@ -739,6 +747,9 @@ const dataManager = {
         if (alert.alert_type.includes('percent')) {
             return `${alert.threshold}%`;
         }
+        if (!alert.alert_type.startsWith('price_')) {
+            return `${alert.threshold} days`;
+        }
         return `$${alert.threshold.toFixed(2)}`;
     },
 
@@ -1108,7 +1119,15 @@ const uiManager = {
             'price_above': { text: '💰 Price Threshold ($)', placeholder: '210.00', step: '0.01' },
             'price_below': { text: '💰 Price Threshold ($)', placeholder: '180.00', step: '0.01' },
             'percent_up': { text: '📈 Percentage Threshold (%)', placeholder: '5.0', step: '0.1' },
-            'percent_down': { text: '📉 Percentage Threshold (%)', placeholder: '5.0', step: '0.1' }
+            'percent_down': { text: '📉 Percentage Threshold (%)', placeholder: '5.0', step: '0.1' },
+            'sma_cross_above': { text: '📊 Period (days)', placeholder: '50', step: '1' },
+            'sma_cross_below': { text: '📊 Period (days)', placeholder: '50', step: '1' },
+            'ema_cross_above': { text: '📊 Period (days)', placeholder: '20', step: '1' },
+            'ema_cross_below': { text: '📊 Period (days)', placeholder: '20', step: '1' },
+            'new_high': { text: '🏔️ Lookback (days)', placeholder: '52', step: '1' },
+            'new_low': { text: '🕳️ Lookback (days)', placeholder: '52', step: '1' },
+            'bollinger_upper': { text: '📐 Band Period (days)', placeholder: '20', step: '1' },
+            'bollinger_lower': { text: '📐 Band Period (days)', placeholder: '20', step: '1' }
         };
         
         const config = labelConfig[alertType.value] || { text: '🎯 Threshold', placeholder: '', step: '0.01' };